@@ -0,0 +1,198 @@
+"""
+Chunk counts, speed and retrieval recall of the article chunkers.
+
+Compares the 512/200 character RecursiveCharacterTextSplitter the pipeline
+used to split with against the sentence chunker in website/chunking.py, on
+the pages recorded in the replay cassettes. For retrieval, the sentences of
+each claim's articles most similar to the claim stand in for its evidence;
+recall@k is the share of an evidence sentence's words found in the best of
+the k chunks most similar to the claim, averaged over the evidence. Partial
+sentences count for what they hold, so a splitter that cuts sentences isn't
+scored zero for it. Tokens are those of the embedding backend's model. Every
+text is embedded through the embedding cache, so repeat runs cost nothing:
+
+    python -m benchmarks.chunking --tokens 128 --overlap 16 --output chunking.json
+"""
+import os
+import re
+import sys
+import json
+import glob
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from website.replay import DEFAULT_FIXTURES_DIR
+from website.scraper import FetchedPage
+from website.extract import extract_article_text
+from website.chunking import SentenceChunker, split_sentences
+from benchmarks.pipeline import summarize, git_commit, cosine
+
+TOP_K = (3, 5)
+
+
+def load_cassette_articles(directory):
+    """[(claim, [article text])] for every cassette with scraped pages"""
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, encoding='utf-8') as f:
+            cassette = json.load(f)
+        articles = []
+        for interaction in cassette['interactions']:
+            if interaction['kind'] == 'page':
+                page = FetchedPage.from_dict(interaction['response'])
+                text = extract_article_text(page.text) if page.content else ''
+                if text:
+                    articles.append(text)
+        if articles:
+            corpus.append((cassette['claim'], articles))
+    return corpus
+
+
+def splitters(tokens, overlap, tokenizer=None):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return {
+        'recursive_512_200': RecursiveCharacterTextSplitter(chunk_size=512, chunk_overlap=200, length_function=len),
+        f'sentence_{tokens}_{overlap}': SentenceChunker(tokens, overlap, tokenizer=tokenizer)
+    }
+
+
+def normalize(text):
+    return ' '.join(text.split())
+
+
+def words(text):
+    return set(re.findall(r'\w+', text.lower()))
+
+
+def overlap(sentence, chunks):
+    """Share of the sentence's words found in the chunk holding most of them"""
+    wanted = words(sentence)
+    if not wanted:
+        return None
+    return max((len(wanted & words(chunk)) / len(wanted) for chunk in chunks), default=0.0)
+
+
+def evidence_sentences(embeddings, claim_vector, articles, count):
+    sentences = list(dict.fromkeys(
+        normalize(sentence) for article in articles for sentence in split_sentences(article)
+        if len(sentence.split()) >= 5
+    ))
+    if not sentences:
+        return []
+    vectors = embeddings.embed_documents(sentences)
+    ranked = sorted(zip(sentences, vectors), key=lambda item: cosine(claim_vector, item[1]), reverse=True)
+    return [sentence for sentence, _ in ranked[:count]]
+
+
+def benchmark(splitter, corpus, counter, embeddings=None, evidence=None):
+    timings = []
+    chunk_counts = []
+    chunk_tokens = []
+    sentence_ends = 0
+    recalls = {k: [] for k in TOP_K}
+    for claim, articles in corpus:
+        chunks = []
+        for article in articles:
+            started = time.perf_counter()
+            article_chunks = splitter.split_text(article)
+            timings.append((time.perf_counter() - started) * 1000)
+            chunk_counts.append(len(article_chunks))
+            chunks.extend(article_chunks)
+
+        for chunk in chunks:
+            chunk_tokens.append(counter.count_tokens(chunk))
+            sentence_ends += chunk.rstrip('"\'”’)]').endswith(('.', '!', '?'))
+
+        if embeddings is None or not evidence.get(claim) or not chunks:
+            continue
+        claim_vector = embeddings.embed_query(claim)
+        ranked = sorted(
+            zip(chunks, embeddings.embed_documents(chunks)), key=lambda item: cosine(claim_vector, item[1]), reverse=True
+        )
+        for k in TOP_K:
+            retrieved = [chunk for chunk, _ in ranked[:k]]
+            scores = [overlap(sentence, retrieved) for sentence in evidence[claim]]
+            scores = [score for score in scores if score is not None]
+            if scores:
+                recalls[k].append(sum(scores) / len(scores))
+
+    result = {
+        'chunks': sum(chunk_counts),
+        'chunks_per_article': summarize(chunk_counts),
+        'tokens_embedded': sum(chunk_tokens),
+        'tokens_per_chunk': summarize(chunk_tokens),
+        'ending_at_sentence': round(sentence_ends / len(chunk_tokens), 3) if chunk_tokens else None,
+        'milliseconds_per_article': summarize(timings)
+    }
+    if embeddings is not None:
+        result['recall'] = {
+            f'at_{k}': round(sum(values) / len(values), 3) if values else None for k, values in recalls.items()
+        }
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cassettes', default=DEFAULT_FIXTURES_DIR, help='Replay cassettes to take pages from')
+    parser.add_argument('--tokens', type=int, default=128, help='Token budget of the sentence chunker')
+    parser.add_argument('--overlap', type=int, default=16, help='Overlap budget of the sentence chunker')
+    parser.add_argument(
+        '--backend', choices=('openai', 'local'), default='openai', help='Embeddings counting tokens and measuring recall'
+    )
+    parser.add_argument('--evidence', type=int, default=3, help='Sentences per claim counted as its evidence')
+    parser.add_argument('--no-recall', action='store_true', help='Only count chunks, embed nothing')
+    parser.add_argument('--output', help='Write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    corpus = load_cassette_articles(args.cassettes)
+    if not corpus:
+        parser.error('No recorded pages found, record some cassettes first')
+    print(f"{len(corpus)} claims, {sum(len(articles) for _, articles in corpus)} articles")
+
+    embeddings = None
+    tokenizer = None
+    if args.backend == 'local':
+        from website.embeddings import create_local_embeddings
+
+        # Loaded even with --no-recall, since the chunks are counted in the local model's tokens
+        local = create_local_embeddings()
+        tokenizer = local.embeddings.tokenizer
+        if not args.no_recall:
+            embeddings = local
+    elif not args.no_recall:
+        from website.embeddings import create_embeddings
+
+        embeddings = create_embeddings()
+
+    evidence = {}
+    if embeddings is not None:
+        for claim, articles in corpus:
+            evidence[claim] = evidence_sentences(embeddings, embeddings.embed_query(claim), articles, args.evidence)
+
+    # Counts tokens the way the pipeline does for this backend
+    counter = SentenceChunker(tokenizer=tokenizer)
+    report = {'commit': git_commit(), 'claims': len(corpus), 'backend': args.backend, 'splitters': {}}
+    for name, splitter in splitters(args.tokens, args.overlap, tokenizer).items():
+        result = benchmark(splitter, corpus, counter, embeddings, evidence)
+        report['splitters'][name] = result
+        recall = result.get('recall', {})
+        print(
+            f"{name:<22} {result['chunks']} chunks, {result['tokens_embedded']} tokens, "
+            f"{result['ending_at_sentence']:.0%} end at a sentence, "
+            f"{result['milliseconds_per_article']['p50']}ms/article, "
+            f"recall@3 {recall.get('at_3')} @5 {recall.get('at_5')}"
+        )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Quality and latency of a local embedding model against text-embedding-3-small.
+
+The corpus is every text embedded in the replay cassettes, whose recordings
+hold the OpenAI vectors, so no chunk is sent to OpenAI again. For each claim
+the texts of its cassette are ranked by similarity to it with both models,
+and the report has how many of OpenAI's top k the local model also ranks in
+its top k, next to the milliseconds per text for the chunks, per claim
+query, and the recorded OpenAI latencies. Claims not embedded in their own
+cassette are embedded through OpenAI once, or skipped with --offline:
+
+    python -m benchmarks.embeddings --variants fp32,int8 --output embeddings.json
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from website.replay import DEFAULT_FIXTURES_DIR
+from website.embeddings import LOCAL_EMBEDDING_MODEL
+from benchmarks.pipeline import summarize, git_commit, cosine
+
+TOP_K = (3, 5, 10)
+
+
+def load_cassette_embeddings(directory):
+    """[(claim, {text: openai vector}, [recorded seconds per text])] for every cassette with embeddings"""
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, encoding='utf-8') as f:
+            cassette = json.load(f)
+        vectors = {}
+        seconds = []
+        for interaction in cassette['interactions']:
+            if interaction['kind'] == 'embedding':
+                vectors[interaction['request']['text']] = interaction['response']
+                seconds.append(interaction['seconds'])
+        if vectors:
+            corpus.append((cassette['claim'], vectors, seconds))
+    return corpus
+
+
+def ranking(query, vectors):
+    """Indexes of vectors from most to least similar to query"""
+    return sorted(range(len(vectors)), key=lambda i: cosine(query, vectors[i]), reverse=True)
+
+
+def recall_at(reference, candidate, k):
+    wanted = set(reference[:k])
+    return len(wanted & set(candidate[:k])) / len(wanted) if wanted else None
+
+
+def benchmark(embeddings, corpus, claim_vectors):
+    """Embed every text and claim of the corpus with a LocalEmbeddings, returning timings and recalls"""
+    text_timings = []
+    query_timings = []
+    recalls = {k: [] for k in TOP_K}
+    for claim, vectors, _ in corpus:
+        texts = [text for text in vectors if text != claim]
+        if claim not in claim_vectors or not texts:
+            continue
+
+        started = time.perf_counter()
+        local_vectors = embeddings.embed_documents(texts)
+        text_timings.append((time.perf_counter() - started) * 1000 / len(texts))
+
+        started = time.perf_counter()
+        local_query = embeddings.embed_query(claim)
+        query_timings.append((time.perf_counter() - started) * 1000)
+
+        reference = ranking(claim_vectors[claim], [vectors[text] for text in texts])
+        candidate = ranking(local_query, local_vectors)
+        for k in TOP_K:
+            recalls[k].append(recall_at(reference, candidate, k))
+
+    return {
+        'milliseconds_per_text': summarize(text_timings),
+        'milliseconds_per_query': summarize(query_timings),
+        'recall': {
+            f'at_{k}': round(sum(values) / len(values), 3) if values else None for k, values in recalls.items()
+        }
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cassettes', default=DEFAULT_FIXTURES_DIR, help='Replay cassettes to take texts from')
+    parser.add_argument('--model', default=LOCAL_EMBEDDING_MODEL, help='Hugging Face model to compare')
+    parser.add_argument('--variants', default='fp32,int8', help='Comma separated, fp32 and/or int8')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--offline', action='store_true', help="Skip claims whose OpenAI vector wasn't recorded")
+    parser.add_argument('--output', help='Write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    corpus = load_cassette_embeddings(args.cassettes)
+    if not corpus:
+        parser.error('No recorded embeddings found, record some cassettes first')
+
+    claim_vectors = {claim: vectors[claim] for claim, vectors, _ in corpus if claim in vectors}
+    missing = [claim for claim, _, _ in corpus if claim not in claim_vectors]
+    if missing and not args.offline:
+        from website.embeddings import create_embeddings
+        claim_vectors.update(zip(missing, create_embeddings().embed_documents(missing)))
+
+    texts = sum(len(vectors) for _, vectors, _ in corpus)
+    print(f"{len(corpus)} claims, {texts} recorded texts, {len(claim_vectors)} claims with an OpenAI vector")
+
+    # Imported here so --help works without torch
+    from website.embeddings import LocalEmbeddings
+
+    openai_seconds = [seconds * 1000 for _, _, timings in corpus for seconds in timings]
+    report = {
+        'commit': git_commit(),
+        'model': args.model,
+        'claims': len(claim_vectors),
+        'texts': texts,
+        'openai_recorded_milliseconds_per_text': summarize(openai_seconds),
+        'variants': {}
+    }
+    for variant in args.variants.split(','):
+        started = time.perf_counter()
+        embeddings = LocalEmbeddings(args.model, int8=variant == 'int8', batch_size=args.batch_size)
+        load_seconds = time.perf_counter() - started
+        # One untimed call so lazy initialisation isn't counted against the first claim
+        embeddings.embed_query('warm up')
+
+        result = benchmark(embeddings, corpus, claim_vectors)
+        result['load_seconds'] = round(load_seconds, 2)
+        report['variants'][variant] = result
+        print(
+            f"{variant:<6} {result['milliseconds_per_text']['p50']}ms/text, "
+            f"query p50 {result['milliseconds_per_query']['p50']}ms p95 {result['milliseconds_per_query']['p95']}ms, "
+            f"recall@5 {result['recall']['at_5']} of OpenAI's top 5, loaded in {result['load_seconds']}s"
+        )
+    print(f"openai recorded p50 {report['openai_recorded_milliseconds_per_text']['p50']}ms/text")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
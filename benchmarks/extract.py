@@ -0,0 +1,105 @@
+"""
+Microbenchmark of the HTML extractors in website/extract.py.
+
+The corpus is every page recorded in the replay cassettes, or the .html files
+in --pages. Each backend extracts every page --rounds times; the report has
+milliseconds per page, throughput and how often each backend's text matches
+the original html.parser extractor:
+
+    python -m benchmarks.extract --rounds 5 --output extract.json
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from website.extract import EXTRACTORS
+from website.replay import DEFAULT_FIXTURES_DIR
+from website.scraper import FetchedPage
+from benchmarks.pipeline import summarize, git_commit
+
+BASELINE = 'html.parser'
+
+
+def load_cassette_pages(directory):
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, encoding='utf-8') as f:
+            interactions = json.load(f)['interactions']
+        for interaction in interactions:
+            if interaction['kind'] == 'page':
+                page = FetchedPage.from_dict(interaction['response'])
+                if page.content:
+                    pages[page.url] = page.text
+    return pages
+
+
+def load_html_pages(directory):
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def benchmark(extract, pages, rounds):
+    timings = []
+    texts = {}
+    for _ in range(rounds):
+        for name, html in pages.items():
+            started = time.perf_counter()
+            texts[name] = extract(html)
+            timings.append((time.perf_counter() - started) * 1000)
+    total_seconds = sum(timings) / 1000
+    return texts, {
+        'milliseconds_per_page': summarize(timings),
+        'pages_per_second': round(len(timings) / total_seconds, 1) if total_seconds else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cassettes', default=DEFAULT_FIXTURES_DIR, help='Replay cassettes to take pages from')
+    parser.add_argument('--pages', help='Directory of .html files to use instead of the cassettes')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--output', help='Write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    pages = load_html_pages(args.pages) if args.pages else load_cassette_pages(args.cassettes)
+    if not pages:
+        parser.error('No pages found, record some cassettes or pass --pages')
+
+    megabytes = sum(len(html.encode('utf-8')) for html in pages.values()) / (1024 * 1024)
+    print(f"{len(pages)} pages, {megabytes:.1f} MB of HTML, {args.rounds} rounds")
+
+    baseline_texts = None
+    backends = {}
+    for backend in [BASELINE] + [name for name in EXTRACTORS if name != BASELINE]:
+        texts, result = benchmark(EXTRACTORS[backend], pages, args.rounds)
+        if baseline_texts is None:
+            baseline_texts = texts
+        result['identical_to_baseline'] = round(
+            sum(1 for name in pages if texts[name] == baseline_texts[name]) / len(pages), 3
+        )
+        backends[backend] = result
+        timing = result['milliseconds_per_page']
+        print(
+            f"{backend:<12} p50 {timing['p50']:.2f}ms p95 {timing['p95']:.2f}ms "
+            f"{result['pages_per_second']} pages/s, {result['identical_to_baseline']:.0%} identical to {BASELINE}"
+        )
+
+    report = {'commit': git_commit(), 'pages': len(pages), 'rounds': args.rounds, 'backends': backends}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
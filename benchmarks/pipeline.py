@@ -0,0 +1,219 @@
+"""
+End-to-end benchmark of the fact-check pipeline.
+
+Runs a corpus of claims through search_and_embed, get_news or the whole crew,
+by default against the recorded cassettes so no network is needed, and
+reports per-stage latency percentiles, throughput at each concurrency level
+and peak RSS. Every level and repeat starts with empty search, page and
+embedding caches and an empty Chroma store, unless --warm is given, so
+levels are measured alike. The report is also written as JSON for comparing
+commits:
+
+    python -m benchmarks.pipeline --target get_news --concurrency 1,2,4 --output bench.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from website.pipeline import start_run
+from website.replay import replay, OFF, RECORD, REPLAY
+
+TARGETS = ('search_and_embed', 'get_news', 'crew')
+PERCENTILES = (50, 95, 99)
+
+
+def load_claims(path):
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-pct * len(ordered) // 100))
+    return round(ordered[int(rank) - 1], 4)
+
+
+def summarize(values):
+    summary = {'count': len(values)}
+    for pct in PERCENTILES:
+        summary[f'p{pct}'] = percentile(values, pct)
+    summary['mean'] = round(sum(values) / len(values), 4) if values else None
+    return summary
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def pipeline_function(target):
+    # Imported here so --help works without loading the models
+    from website import rag_module
+
+    if target == 'search_and_embed':
+        return rag_module.search_and_embed
+    if target == 'get_news':
+        return rag_module.get_news
+    return lambda claim: rag_module.run_fact_check(claim)[0]
+
+
+def run_claim(fn, claim):
+    """Run one claim and return its metrics, with `failed` set if it raised or returned an error string"""
+    with start_run(claim) as run:
+        try:
+            result = fn(claim)
+            failed = isinstance(result, str) and (result.startswith('Error') or result.startswith('No '))
+        except Exception as e:
+            print(f"Error benchmarking {claim!r}: {str(e)}")
+            failed = True
+    metrics = run.metrics()
+    metrics['failed'] = failed
+    return metrics
+
+
+def reset_state():
+    """
+    Empty the search, page and embedding caches and the news collection, so a
+    level or repeat measures the pipeline rather than the hits left by the
+    one before it.
+    """
+    from website.search_cache import search_cache
+    from website.page_cache import page_cache
+    from website.embeddings import embedding_cache
+    from website.resources import resources
+    from website.vector_store import CHROMA_DIRECTORY, NEWS_COLLECTION, collection_for_model
+
+    search_cache.clear()
+    page_cache.clear()
+    embedding_cache.clear()
+    try:
+        import chromadb
+        chromadb.PersistentClient(path=CHROMA_DIRECTORY).delete_collection(
+            collection_for_model(NEWS_COLLECTION, resources.embedding_model)
+        )
+    except Exception:
+        # Nothing stored yet
+        pass
+    resources.reset_news_store()
+
+
+def run_level(fn, claims, concurrency, repeats, reset=True):
+    results = []
+    wall_seconds = 0.0
+    for _ in range(repeats):
+        if reset:
+            reset_state()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results.extend(executor.map(lambda claim: run_claim(fn, claim), claims))
+        wall_seconds += time.perf_counter() - started
+
+    stage_seconds = {}
+    for metrics in results:
+        for record in metrics['timeline']:
+            stage_seconds.setdefault(record['stage'], []).append(record['self_seconds'])
+
+    return {
+        'concurrency': concurrency,
+        'runs': len(results),
+        'failures': sum(1 for metrics in results if metrics['failed']),
+        'wall_seconds': round(wall_seconds, 4),
+        'throughput_per_second': round(len(results) / wall_seconds, 4) if wall_seconds else None,
+        'total': summarize([metrics['total_seconds'] for metrics in results]),
+        'stages': {name: summarize(values) for name, values in sorted(stage_seconds.items())}
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_report(report):
+    for level in report['levels']:
+        print(
+            f"\nconcurrency {level['concurrency']}: {level['runs']} runs, {level['failures']} failed, "
+            f"{level['throughput_per_second']} runs/s, total p50 {level['total']['p50']}s p95 {level['total']['p95']}s"
+        )
+        print(f"  {'stage':<28}{'calls':>7}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for name, summary in level['stages'].items():
+            print(f"  {name:<28}{summary['count']:>7}{summary['p50']:>10}{summary['p95']:>10}{summary['p99']:>10}")
+    print(f"\npeak RSS {report['peak_rss_mb']} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=TARGETS, default='get_news')
+    parser.add_argument('--claims', default=os.path.join(ROOT, 'benchmarks', 'claims.txt'))
+    parser.add_argument('--concurrency', default='1,2,4', help='Comma separated concurrency levels')
+    parser.add_argument('--repeats', type=int, default=1, help='Times each claim is run at every level')
+    parser.add_argument('--warmup', type=int, default=1, help='Claims run first and left out of the report')
+    parser.add_argument('--mode', choices=(REPLAY, RECORD, OFF), default=REPLAY)
+    parser.add_argument('--latency', default='0', help="Seconds slept per replayed call, or 'recorded'")
+    parser.add_argument('--keep-chroma', action='store_true', help='Use ./chroma_db instead of a fresh one')
+    parser.add_argument(
+        '--warm', action='store_true',
+        help='Keep the caches and Chroma between levels and repeats instead of emptying them (implied by --keep-chroma)'
+    )
+    parser.add_argument('--output', help='Write the report to this JSON file')
+    args = parser.parse_args(argv)
+
+    claims = load_claims(args.claims)
+    levels = [int(level) for level in args.concurrency.split(',')]
+    replay.configure(mode=args.mode, latency=args.latency)
+
+    output = os.path.abspath(args.output) if args.output else None
+    if not args.keep_chroma:
+        # Chroma persists to ./chroma_db, so a scratch working directory gives every benchmark an empty store
+        os.chdir(tempfile.mkdtemp(prefix='factfinder-bench-'))
+
+    # Emptying the caches in the working directory is only safe in the scratch one
+    warm = args.warm or args.keep_chroma
+    fn = pipeline_function(args.target)
+    for claim in claims[:args.warmup]:
+        run_claim(fn, claim)
+
+    report = {
+        'commit': git_commit(),
+        'target': args.target,
+        'mode': args.mode,
+        'latency': args.latency,
+        'claims': len(claims),
+        'repeats': args.repeats,
+        'warm': warm,
+        'levels': [run_level(fn, claims, level, args.repeats, reset=not warm) for level in levels],
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+    print_report(report)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {output}")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,10 @@ import streamlit as st
 import requests
 from utils.auth_check import check_auth
 import json
+import time
 
 FLASK_URL = "http://localhost:5000"
+JOB_POLL_INTERVAL = 2
 
 st.set_page_config(
     page_title="Chat Page",
@@ -242,6 +244,70 @@ def save_current_chat():
         st.error(f"Error saving chat: {str(e)}")
 
 
+def wait_for_job(job_id, cookies):
+    """Poll a fact-check job until it finishes and return the final status response"""
+    while True:
+        response = requests.get(f"{FLASK_URL}/rag/jobs/{job_id}", cookies=cookies)
+        if response.status_code != 200:
+            return response
+
+        if response.json()['status'] in ('done', 'failed'):
+            return response
+
+        time.sleep(JOB_POLL_INTERVAL)
+
+
+def read_events(response):
+    """Yield (event, data) pairs from a Server-Sent Events response"""
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].lstrip())
+
+
+def show_fact_check_progress(response):
+    """Render pipeline progress and the analyst's answer as they stream in, return the final result"""
+    status = st.status("Checking facts...", expanded=True)
+    answer = st.empty()
+    tokens = ""
+    result = None
+
+    for event, data in read_events(response):
+        if event == "search":
+            status.write(f"🔎 Found {len(data['results'])} search results")
+        elif event == "scraped":
+            status.write(f"📰 Scraped {len(data['articles'])} articles")
+        elif event == "embedded":
+            status.write(f"🧩 Embedded {data['chunks']} chunks")
+        elif event == "evidence":
+            status.write("📚 Top evidence:")
+            for item in data["results"]:
+                status.write(f"- [{item['title']}]({item['url']}) ({item['score']})")
+            status.update(label="Analysing evidence...")
+        elif event == "token":
+            tokens += data["text"]
+            answer.markdown(tokens)
+        elif event == "result":
+            result = data
+        elif event == "error":
+            status.update(label="Fact check failed", state="error")
+            st.error(f"Failed to process your request: {data['error']}")
+            return None
+
+    status.update(label="Fact check complete", state="complete", expanded=False)
+    if result:
+        answer.markdown(format_json_response(result["output"]))
+    return result
+
+
 def show_chat_interface():
     st.title("News Fact Checker Chat")
     
@@ -276,56 +342,63 @@ def show_chat_interface():
             st.write(prompt)
         
         with st.chat_message("assistant"):
-            with st.spinner("Checking facts..."):
-                try:
-                    # Create session with cookie
-                    if not st.session_state.get('session'):
-                        st.error("Session expired. Please login again")
-                        st.session_state.authenticated = False
-                        st.rerun()
-
-                    cookies = {'session': st.session_state.session}
-
-                    response = requests.post(
-                        f"{FLASK_URL}/rag/process-query",
-                        json={'query': prompt},
-                        cookies=cookies
-                    )
-
-                    # session = requests.Session()
-                    # if st.session_state.get('session_token'):
-                    #     session.cookies.set('session', st.session_state.session_token)
-                    
-                    # response = session.post(
-                    #     f"{FLASK_URL}/rag/process-query",
-                    #     json={"query": prompt},
-                    # )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-
-                        formatted_output = format_json_response(data['output'])
-                        st.write(formatted_output)
-                        
+            try:
+                # Create session with cookie
+                if not st.session_state.get('session'):
+                    st.error("Session expired. Please login again")
+                    st.session_state.authenticated = False
+                    st.rerun()
+
+                cookies = {'session': st.session_state.session}
+
+                response = requests.post(
+                    f"{FLASK_URL}/rag/process-query/stream",
+                    json={'query': prompt},
+                    cookies=cookies,
+                    stream=True
+                )
+
+                if response.status_code == 503:
+                    # Every streaming worker is busy, so queue the claim as a job and wait for it
+                    with st.spinner("Waiting for a free fact-checker..."):
+                        response = requests.post(
+                            f"{FLASK_URL}/rag/jobs",
+                            json={'query': prompt},
+                            cookies=cookies
+                        )
+                        if response.status_code == 202:
+                            response = wait_for_job(response.json()['job_id'], cookies)
+
+                    if response.status_code == 200 and response.json()['status'] == 'failed':
+                        st.error(f"Failed to process your request: {response.json().get('error')}")
+                        data = None
+                    elif response.status_code == 200:
+                        data = response.json()['result']
+                        st.markdown(format_json_response(data['output']))
+                elif response.status_code == 200:
+                    data = show_fact_check_progress(response)
+
+                if response.status_code == 200:
+                    if data:
                         message_data = {
                             "role": "assistant",
                             "content": data["output"]
                         }
-                        
+
                         if "context" in data:
                             with st.expander("View Sources"):
                                 st.write(data["context"])
                             message_data["sources"] = data["context"]
-                        
+
                         st.session_state.messages.append(message_data)
-                    elif response.status_code == [401, 302]:  # Redirect to login
-                        st.error("Session expired. Please login again.")
-                        st.session_state.authenticated = False
-                        st.rerun()
-                    else:
-                        st.error(f"Failed to process your request. Status code: {response.status_code}")
-                except Exception as e:
-                    st.error(f"Error: {str(e)}")
+                elif response.status_code in [401, 302]:  # Redirect to login
+                    st.error("Session expired. Please login again.")
+                    st.session_state.authenticated = False
+                    st.rerun()
+                else:
+                    st.error(f"Failed to process your request. Status code: {response.status_code}")
+            except Exception as e:
+                st.error(f"Error: {str(e)}")
     if st.session_state.messages:
         save_current_chat()
 
@@ -31,13 +31,50 @@ def create_app():
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS', 'False')
+    app.config['FACT_CHECK_WORKERS'] = int(os.getenv('FACT_CHECK_WORKERS', 2))
+    app.config['FACT_CHECK_JOBS_DB'] = os.getenv('FACT_CHECK_JOBS_DB')
+    app.config['FACT_CHECK_STREAM_WORKERS'] = int(os.getenv('FACT_CHECK_STREAM_WORKERS', 2))
+    app.config['FACT_CHECK_BATCH_MAX_CLAIMS'] = int(os.getenv('FACT_CHECK_BATCH_MAX_CLAIMS', 50))
+    app.config['CLAIM_CACHE_THRESHOLD'] = float(os.getenv('CLAIM_CACHE_THRESHOLD', 0.92))
+    app.config['CLAIM_CACHE_TTL'] = int(os.getenv('CLAIM_CACHE_TTL', 24 * 60 * 60))
+    app.config['SCRAPER_MAX_IN_FLIGHT'] = int(os.getenv('SCRAPER_MAX_IN_FLIGHT', 20))
+    app.config['SCRAPER_PER_HOST'] = int(os.getenv('SCRAPER_PER_HOST', 2))
+    app.config['SCRAPER_CONNECT_TIMEOUT'] = float(os.getenv('SCRAPER_CONNECT_TIMEOUT', 5))
+    app.config['SCRAPER_READ_TIMEOUT'] = float(os.getenv('SCRAPER_READ_TIMEOUT', 10))
+    app.config['SCRAPER_TOTAL_TIMEOUT'] = float(os.getenv('SCRAPER_TOTAL_TIMEOUT', 20))
+    app.config['SCRAPER_MAX_BYTES'] = int(os.getenv('SCRAPER_MAX_BYTES', 2 * 1024 * 1024))
+    app.config['SCRAPER_HEAD_BYTES'] = int(os.getenv('SCRAPER_HEAD_BYTES', 64 * 1024))
+    app.config['SCRAPER_HOST_RATE'] = float(os.getenv('SCRAPER_HOST_RATE', 2))
+    app.config['SCRAPER_HOST_BURST'] = int(os.getenv('SCRAPER_HOST_BURST', 4))
+    app.config['SCRAPER_BREAKER_FAILURE_RATE'] = float(os.getenv('SCRAPER_BREAKER_FAILURE_RATE', 0.5))
+    app.config['SCRAPER_BREAKER_MIN_REQUESTS'] = int(os.getenv('SCRAPER_BREAKER_MIN_REQUESTS', 5))
+    app.config['SCRAPER_BREAKER_COOLDOWN'] = float(os.getenv('SCRAPER_BREAKER_COOLDOWN', 30))
+    app.config['SEARCH_CACHE_TTL'] = int(os.getenv('SEARCH_CACHE_TTL', 60 * 60))
+    app.config['SEARCH_CACHE_MAX_ENTRIES'] = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 1024))
+    app.config['SOURCE_ALLOW'] = os.getenv('SOURCE_ALLOW')
+    app.config['SOURCE_DENY'] = os.getenv('SOURCE_DENY')
+    app.config['SOURCE_PAYWALL'] = os.getenv('SOURCE_PAYWALL')
+    app.config['EMBEDDING_BACKEND'] = os.getenv('EMBEDDING_BACKEND', 'openai')
+    app.config['LOCAL_EMBEDDING_MODEL'] = os.getenv('LOCAL_EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+    app.config['LOCAL_EMBEDDING_INT8'] = os.getenv('LOCAL_EMBEDDING_INT8', 'true').lower() in ('1', 'true', 'yes')
+    app.config['LOCAL_EMBEDDING_BATCH_SIZE'] = int(os.getenv('LOCAL_EMBEDDING_BATCH_SIZE', 32))
+    app.config['OPENAI_MAX_CONNECTIONS'] = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+    app.config['EMBEDDING_BATCH_WAIT_MS'] = float(os.getenv('EMBEDDING_BATCH_WAIT_MS', 5))
+    app.config['EMBEDDING_TOKENS_PER_MINUTE'] = int(os.getenv('EMBEDDING_TOKENS_PER_MINUTE', 1000000))
+    app.config['EMBEDDING_CACHE_DB'] = os.getenv('EMBEDDING_CACHE_DB', './embedding_cache.db')
+    app.config['CHROMA_RETENTION_INTERVAL'] = int(os.getenv('CHROMA_RETENTION_INTERVAL', 60 * 60))
+    app.config['CHROMA_MAX_AGE'] = int(os.getenv('CHROMA_MAX_AGE', 30 * 24 * 60 * 60))
+    app.config['CHROMA_MAX_CHUNKS'] = int(os.getenv('CHROMA_MAX_CHUNKS', 50000))
+    app.config['PAGE_CACHE_DIR'] = os.getenv('PAGE_CACHE_DIR', './page_cache')
+    app.config['PAGE_CACHE_FRESHNESS'] = int(os.getenv('PAGE_CACHE_FRESHNESS', 60 * 60))
+    app.config['PAGE_CACHE_MAX_BYTES'] = int(os.getenv('PAGE_CACHE_MAX_BYTES', 200 * 1024 * 1024))
 
     db.init_app(app) 
     migrate.init_app(app, db)
 
     from .views import views
     from .auth import auth
-    from .rag import rag
+    from .rag import rag, fact_check_and_record, claim_cache, stream_pool
     from .users import users
     from .rag_api import rag_api
     from .admin import admin
@@ -49,6 +86,40 @@ def create_app():
     app.register_blueprint(rag_api, url_prefix='/')
     app.register_blueprint(admin, url_prefix='/')
 
+    from .jobs import job_queue
+    job_queue.init_app(app, runner=fact_check_and_record)
+    claim_cache.init_app(app)
+    stream_pool.init_app(app)
+
+    from .scraper import fetcher
+    from .page_cache import page_cache
+    from .search_cache import search_cache
+    from .source_policy import source_policy
+    from .embeddings import embedding_cache, embedding_batcher
+    fetcher.init_app(app)
+    page_cache.init_app(app)
+    search_cache.init_app(app)
+    source_policy.init_app(app)
+    embedding_cache.init_app(app)
+    embedding_batcher.init_app(app)
+
+    from .resources import resources
+    resources.init_app(app)
+
+    from .monitoring import monitoring, register_cache
+    app.register_blueprint(monitoring, url_prefix='/')
+    register_cache('claim', claim_cache)
+    register_cache('page', page_cache)
+    register_cache('search', search_cache)
+    register_cache('embedding', embedding_cache)
+
+    from .vector_store import compact_chroma_command, reembed_chroma_command
+    from .retention import chroma_retention, evict_chroma_command
+    chroma_retention.init_app(app)
+    app.cli.add_command(compact_chroma_command)
+    app.cli.add_command(evict_chroma_command)
+    app.cli.add_command(reembed_chroma_command)
+
     from .models import User, RAGQuery, Admin
     
     create_database(app)
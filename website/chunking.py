@@ -0,0 +1,132 @@
+import re
+from .tokens import count_tokens, get_encoding
+from .embeddings import EMBEDDING_MODEL
+
+CHUNK_TOKENS = 128
+CHUNK_OVERLAP_TOKENS = 16
+
+# Words ending in a full stop that rarely end a sentence in news copy
+_ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'gen', 'gov', 'sen', 'rep', 'col', 'lt', 'sgt', 'capt',
+    'hon', 'vs', 'etc', 'inc', 'ltd', 'co', 'corp', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug',
+    'sep', 'sept', 'oct', 'nov', 'dec', 'u.s', 'u.k', 'u.n', 'e.g', 'i.e'
+}
+
+# A possible boundary: end punctuation, optional closing quotes or brackets, then whitespace
+_BOUNDARY = re.compile(r'[.!?]+["\'”’)\]]*\s+')
+
+
+def split_sentences(text):
+    """Split text into sentences at end punctuation and line breaks, keeping abbreviations like Dr. whole"""
+    sentences = []
+    for paragraph in text.split('\n'):
+        paragraph = paragraph.strip()
+        start = 0
+        for match in _BOUNDARY.finditer(paragraph):
+            end = match.end()
+            words = paragraph[start:match.start()].split()
+            next_char = paragraph[end:end + 1]
+            if (words and words[-1].lower().rstrip('.') in _ABBREVIATIONS) or (next_char and next_char.islower()):
+                continue
+            sentences.append(paragraph[start:end].strip())
+            start = end
+        if paragraph[start:].strip():
+            sentences.append(paragraph[start:].strip())
+    return sentences
+
+
+class SentenceChunker:
+    """
+    Packs whole sentences into chunks of up to `max_tokens` tokens of the
+    embedding model. Each chunk starts with the last sentences of the one
+    before it, as long as they fit in `overlap_tokens`, so a statement split
+    across a chunk boundary is still found whole. Text that fits in one chunk
+    is returned as it is, and a sentence longer than a chunk is cut at token
+    boundaries.
+
+    Tokens are counted with tiktoken for `model`, or with `tokenizer`, the
+    Hugging Face tokenizer of a local embedding model, when one is given.
+    """
+    def __init__(self, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, model=EMBEDDING_MODEL,
+                 tokenizer=None):
+        if overlap_tokens >= max_tokens:
+            raise ValueError('overlap_tokens must be smaller than max_tokens')
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.model = model
+        self.tokenizer = tokenizer
+
+    def count_tokens(self, text):
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        return count_tokens(text, self.model)
+
+    def split_text(self, text):
+        text = text.strip()
+        if not text:
+            return []
+        if self.count_tokens(text) <= self.max_tokens:
+            return [text]
+
+        sentences = []
+        for sentence in split_sentences(text):
+            tokens = self.count_tokens(sentence)
+            if tokens <= self.max_tokens:
+                sentences.append((sentence, tokens))
+            else:
+                sentences.extend(self._cut(sentence))
+
+        chunks = []
+        current, current_tokens = [], 0
+        for sentence, tokens in sentences:
+            if current and current_tokens + tokens > self.max_tokens:
+                chunks.append(' '.join(sentence for sentence, _ in current))
+                current, current_tokens = self._overlap(current, tokens)
+            current.append((sentence, tokens))
+            current_tokens += tokens
+        if current:
+            chunks.append(' '.join(sentence for sentence, _ in current))
+        return chunks
+
+    def _overlap(self, sentences, next_tokens):
+        """The trailing sentences to repeat in the next chunk, leaving room for the sentence that opens it"""
+        budget = min(self.overlap_tokens, self.max_tokens - next_tokens)
+        kept, tokens = [], 0
+        for sentence, sentence_tokens in reversed(sentences):
+            if tokens + sentence_tokens > budget:
+                break
+            kept.insert(0, (sentence, sentence_tokens))
+            tokens += sentence_tokens
+        return kept, tokens
+
+    def _cut(self, sentence):
+        """(piece, tokens) pieces of a sentence too long for one chunk"""
+        if self.tokenizer is not None:
+            # Cut at the tokens' character offsets, since decoding an uncased model's tokens lowercases the text
+            offsets = self.tokenizer(sentence, add_special_tokens=False, return_offsets_mapping=True)['offset_mapping']
+            pieces = [offsets[start:start + self.max_tokens] for start in range(0, len(offsets), self.max_tokens)]
+            return [(sentence[piece[0][0]:piece[-1][1]].strip(), len(piece)) for piece in pieces]
+
+        encoding = get_encoding(self.model)
+        if encoding is not None:
+            tokens = encoding.encode(sentence, disallowed_special=())
+            return [
+                (encoding.decode(tokens[start:start + self.max_tokens]).strip(), len(tokens[start:start + self.max_tokens]))
+                for start in range(0, len(tokens), self.max_tokens)
+            ]
+
+        # Without the tokenizer, cut between words at the estimated four characters per token
+        max_chars = self.max_tokens * 4
+        pieces, words = [], []
+        for word in sentence.split():
+            if words and count_tokens(' '.join(words + [word]), self.model) > self.max_tokens:
+                pieces.append(' '.join(words))
+                words = []
+            # A word longer than a whole chunk, such as a URL, is cut by characters
+            while len(word) > max_chars:
+                pieces.append(word[:max_chars])
+                word = word[max_chars:]
+            words.append(word)
+        if words:
+            pieces.append(' '.join(words))
+        return [(piece, count_tokens(piece, self.model)) for piece in pieces]
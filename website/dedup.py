@@ -0,0 +1,92 @@
+import re
+import random
+import hashlib
+
+NUM_PERMUTATIONS = 64
+SHINGLE_SIZE = 5
+
+# Each permutation XORs the 64-bit shingle hashes with its own fixed random mask,
+# which is much cheaper in Python than the usual (a * h + b) % p family
+_random = random.Random(42)
+_MASKS = [_random.getrandbits(64) for _ in range(NUM_PERMUTATIONS)]
+
+ARTICLE_THRESHOLD = 0.8
+CHUNK_THRESHOLD = 0.9
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Hashes of the overlapping runs of `size` words in the text, ignoring case and punctuation"""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        words = words + [''] * (size - len(words))
+    return {
+        int.from_bytes(hashlib.blake2b(' '.join(words[i:i + size]).encode('utf-8'), digest_size=8).digest(), 'big')
+        for i in range(len(words) - size + 1)
+    }
+
+
+def minhash(text):
+    """MinHash signature of a text; the share of equal positions estimates the Jaccard similarity of two texts"""
+    hashes = shingles(text)
+    return tuple(min(h ^ mask for h in hashes) for mask in _MASKS)
+
+
+def similarity(signature, other):
+    return sum(1 for x, y in zip(signature, other) if x == y) / len(signature)
+
+
+def _group(texts, threshold):
+    """
+    Index of the first near-duplicate of each text, or its own index if it is
+    the first of its kind. Comparisons are pairwise, which is fine for the
+    handful of articles and few hundred chunks of one claim.
+    """
+    signatures = []
+    groups = []
+    for i, text in enumerate(texts):
+        signature = minhash(text)
+        group = i
+        for j, (kept, kept_signature) in enumerate(signatures):
+            if similarity(signature, kept_signature) >= threshold:
+                group = kept
+                break
+        if group == i:
+            signatures.append((i, signature))
+        groups.append(group)
+    return groups
+
+
+def dedupe_articles(articles, threshold=ARTICLE_THRESHOLD):
+    """
+    Collapse near-duplicate scraped articles, such as one wire story syndicated
+    by several sites. The first copy is kept, with the URLs of every copy in
+    its 'urls'.
+    """
+    groups = _group([article['content'] for article in articles], threshold)
+    kept = {}
+    for article, group in zip(articles, groups):
+        if group not in kept:
+            kept[group] = dict(article, urls=list(article.get('urls', [article['url']])))
+        else:
+            kept[group]['urls'].append(article['url'])
+    return list(kept.values())
+
+
+def dedupe_documents(documents, threshold=CHUNK_THRESHOLD):
+    """
+    Collapse near-duplicate chunk Documents. The first copy is kept and the
+    URLs of the others are added to its space separated 'sources' metadata,
+    since Chroma metadata can't hold lists.
+    """
+    groups = _group([doc.page_content for doc in documents], threshold)
+    kept = {}
+    for doc, group in zip(documents, groups):
+        if group not in kept:
+            kept[group] = doc
+            continue
+        sources = kept[group].metadata['sources'].split()
+        for url in doc.metadata['sources'].split():
+            if url not in sources:
+                sources.append(url)
+        kept[group].metadata['sources'] = ' '.join(sources)
+    return list(kept.values())
@@ -0,0 +1,366 @@
+import os
+import time
+import array
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from .pipeline import stage, count
+from .tokens import count_tokens
+from .replay import replay
+from .host_health import TokenBucket
+
+EMBEDDING_MODEL = 'text-embedding-3-small'
+
+# Default model of the local backend, 384 dimensions and small enough to run on the web server's CPU
+LOCAL_EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+class EmbeddingCache:
+    """
+    SQLite table of embeddings keyed by the SHA-256 of the model name and the
+    text, with the vectors stored as packed float32, so a chunk scraped again
+    is never sent to OpenAI twice. An empty db_path turns it off.
+    """
+    # SQLite allows at most 999 parameters per statement in older versions
+    BATCH_SIZE = 500
+
+    def __init__(self, db_path='./embedding_cache.db'):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.db_path = app.config.get('EMBEDDING_CACHE_DB', self.db_path)
+        self._ready = False
+        app.extensions['embedding_cache'] = self
+
+    def _connect(self):
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    directory = os.path.dirname(self.db_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    with sqlite3.connect(self.db_path, timeout=30) as conn:
+                        conn.execute('PRAGMA journal_mode=WAL')
+                        conn.execute('CREATE TABLE IF NOT EXISTS embedding (key TEXT PRIMARY KEY, vector BLOB NOT NULL)')
+                    self._ready = True
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get_many(self, model, texts):
+        """Cached vectors for the texts, with None for the ones not cached yet"""
+        if not self.db_path:
+            return [None] * len(texts)
+
+        keys = [_key(model, text) for text in texts]
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(keys), self.BATCH_SIZE):
+                batch = keys[start:start + self.BATCH_SIZE]
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embedding WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                found.update(rows)
+
+        vectors = [_unpack(found[key]) if key in found else None for key in keys]
+        hits = sum(1 for vector in vectors if vector is not None)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, model, texts, vectors):
+        if not self.db_path:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO embedding (key, vector) VALUES (?, ?)',
+                [(_key(model, text), _pack(vector)) for text, vector in zip(texts, vectors)]
+            )
+
+    def clear(self):
+        if not self.db_path:
+            return
+        with self._connect() as conn:
+            conn.execute('DELETE FROM embedding')
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+def _key(model, text):
+    return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+
+def _pack(vector):
+    return array.array('f', vector).tobytes()
+
+
+def _unpack(blob):
+    vector = array.array('f')
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+embedding_cache = EmbeddingCache()
+
+
+class EmbeddingBatcher:
+    """
+    Collects the texts every request thread wants embedded for `wait` seconds
+    and sends them to OpenAI together, so concurrent fact-checks share a few
+    large calls instead of making many small ones. A text wanted by several
+    threads in the same window is sent once.
+
+    Batches stay within the API's per-request limits of MAX_TEXTS texts and
+    MAX_TOKENS tokens, and are held back so no more than `tokens_per_minute`
+    tokens are sent. A `wait` of 0 sends every call straight through, as does
+    every call after close().
+    """
+    MAX_TEXTS = 2048
+    MAX_TOKENS = 300000
+
+    def __init__(self, wait=0.005, tokens_per_minute=1000000, max_concurrent=4):
+        self.wait = wait
+        self.max_concurrent = max_concurrent
+        self.batches = 0
+        self.texts = 0
+        self._bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._closed = False
+
+    def init_app(self, app):
+        self.wait = float(app.config.get('EMBEDDING_BATCH_WAIT_MS', self.wait * 1000)) / 1000
+        tokens_per_minute = int(app.config.get('EMBEDDING_TOKENS_PER_MINUTE', self._bucket.burst))
+        self._bucket = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        app.extensions['embedding_batcher'] = self
+
+    def embed(self, embeddings, texts, tokens):
+        """
+        Vectors of `texts` from the langchain `embeddings`, `tokens` holding the
+        token count of each text. Blocks until the batch holding them is back.
+        """
+        futures = []
+        with self._condition:
+            if self.wait > 0 and not self._closed:
+                self._ensure_started()
+                for text, text_tokens in zip(texts, tokens):
+                    future = Future()
+                    self._pending.append((embeddings, text, text_tokens, future))
+                    futures.append(future)
+                self._condition.notify()
+        if futures:
+            return [future.result() for future in futures]
+
+        time.sleep(self._reserve(sum(tokens)))
+        self._count(1, len(texts))
+        return embeddings.embed_documents(texts)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='embedding-batch')
+            self._thread = threading.Thread(target=self._dispatch, name='embedding-batcher', daemon=True)
+            self._thread.start()
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+            # Let the other threads of this window add their texts
+            time.sleep(self.wait)
+            with self._condition:
+                pending, self._pending = self._pending, []
+            for batch in self._batches(pending):
+                try:
+                    self._executor.submit(self._send, batch)
+                except Exception as e:
+                    _fail(batch[1].values(), e)
+
+    def _batches(self, pending):
+        """Split pending (embeddings, text, tokens, future) entries into API sized batches of unique texts"""
+        by_embeddings = {}
+        for embeddings, text, tokens, future in pending:
+            texts = by_embeddings.setdefault(id(embeddings), (embeddings, {}))[1]
+            texts.setdefault(text, (tokens, []))[1].append(future)
+
+        for embeddings, texts in by_embeddings.values():
+            batch, batch_tokens = {}, 0
+            for text, (tokens, futures) in texts.items():
+                if batch and (len(batch) >= self.MAX_TEXTS or batch_tokens + tokens > self.MAX_TOKENS):
+                    yield embeddings, batch, batch_tokens
+                    batch, batch_tokens = {}, 0
+                batch[text] = futures
+                batch_tokens += tokens
+            if batch:
+                yield embeddings, batch, batch_tokens
+
+    def _send(self, batch):
+        embeddings, texts, tokens = batch
+        try:
+            time.sleep(self._reserve(tokens))
+            vectors = embeddings.embed_documents(list(texts))
+        except Exception as e:
+            _fail(texts.values(), e)
+            return
+
+        self._count(1, len(texts))
+        for futures, vector in zip(texts.values(), vectors):
+            for future in futures:
+                future.set_result(vector)
+
+    def _reserve(self, tokens):
+        with self._condition:
+            # A batch larger than a minute's budget would otherwise never be allowed through
+            return self._bucket.reserve(min(tokens, self._bucket.burst))
+
+    def _count(self, batches, texts):
+        with self._condition:
+            self.batches += batches
+            self.texts += texts
+
+    def stats(self):
+        with self._condition:
+            return {'batches': self.batches, 'texts': self.texts}
+
+    def close(self):
+        """Stop the dispatcher and fail the texts still waiting for it; later calls go straight through"""
+        with self._condition:
+            self._closed = True
+            pending, self._pending = self._pending, []
+            self._condition.notify_all()
+        _fail([[future] for _, _, _, future in pending], RuntimeError('The embedding batcher was closed'))
+
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+def _fail(future_lists, error):
+    for futures in future_lists:
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+
+
+embedding_batcher = EmbeddingBatcher()
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Sentence embeddings computed on the CPU by a Hugging Face model, mean
+    pooled over the tokens and normalised, so cosine and L2 rankings agree.
+
+    The model is loaded once and kept. With int8 its linear layers are
+    dynamically quantized, which roughly halves the time per batch. Texts are
+    embedded `batch_size` at a time, sorted by length to keep padding down,
+    and one batch runs at a time since torch already uses every core.
+    """
+    def __init__(self, model=LOCAL_EMBEDDING_MODEL, int8=True, batch_size=32, max_length=256):
+        import torch
+        from transformers import AutoTokenizer, AutoModel
+
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model)
+        self.model = AutoModel.from_pretrained(model).eval()
+        if int8:
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        import torch
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        with self._lock, torch.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                encoded = self.tokenizer(
+                    [texts[i] for i in batch], padding=True, truncation=True,
+                    max_length=self.max_length, return_tensors='pt'
+                )
+                hidden = self.model(**encoded).last_hidden_state
+                mask = encoded['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                pooled = torch.nn.functional.normalize(pooled, dim=1)
+                for i, vector in zip(batch, pooled.tolist()):
+                    vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class TimedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves what it can from the embedding cache and
+    computes the rest. OpenAI calls go through the embedding batcher and are
+    recorded as an `openai_embeddings` stage of the active pipeline run, with
+    the number of texts and tokens sent; local models run in a
+    `local_embeddings` stage.
+    """
+    def __init__(self, embeddings, model, remote=True):
+        self.embeddings = embeddings
+        self.model = model
+        self.remote = remote
+
+    def embed_documents(self, texts):
+        if self.remote and replay.active:
+            # Recorded and replayed runs skip the cache, so every OpenAI embedding is in the cassette
+            vectors = [None] * len(texts)
+        else:
+            vectors = embedding_cache.get_many(self.model, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        count('embedding_cache_hits', len(texts) - len(missing))
+        if not missing:
+            return vectors
+
+        missing_texts = [texts[i] for i in missing]
+        if not self.remote:
+            with stage('local_embeddings', texts=len(missing_texts)):
+                embedded = self.embeddings.embed_documents(missing_texts)
+            count('embedded_texts', len(missing_texts))
+            return self._fill(vectors, missing, missing_texts, embedded)
+
+        text_tokens = [count_tokens(text, self.model) for text in missing_texts]
+        tokens = sum(text_tokens)
+        with stage('openai_embeddings', texts=len(missing_texts), tokens=tokens):
+            embedded = replay.call_batch(
+                'embedding', [{'model': self.model, 'text': text} for text in missing_texts],
+                lambda: embedding_batcher.embed(self.embeddings, missing_texts, text_tokens)
+            )
+        count('embedded_texts', len(missing_texts))
+        count('embedding_tokens', tokens)
+        return self._fill(vectors, missing, missing_texts, embedded)
+
+    def _fill(self, vectors, missing, missing_texts, embedded):
+        embedding_cache.put_many(self.model, missing_texts, embedded)
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def create_embeddings(model=EMBEDDING_MODEL, http_client=None):
+    """Embeddings used for the news and claim cache collections"""
+    return TimedEmbeddings(OpenAIEmbeddings(model=model, http_client=http_client), model)
+
+
+def create_local_embeddings(model=LOCAL_EMBEDDING_MODEL, int8=True, batch_size=32):
+    """Embeddings computed on the CPU, see LocalEmbeddings"""
+    return TimedEmbeddings(LocalEmbeddings(model, int8=int8, batch_size=batch_size), model, remote=False)
@@ -0,0 +1,116 @@
+import time
+from collections import deque
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+
+class CircuitOpen(Exception):
+    """Raised instead of fetching from a host whose circuit is open"""
+
+
+class TokenBucket:
+    """Rate limit of `rate` tokens a second with bursts of up to `burst`, e.g. requests to one host"""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self, amount=1):
+        """Take `amount` tokens and return how many seconds to wait before using them"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker for one host.
+
+    Opens once at least `failure_rate` of the last `window` requests failed,
+    counting only after `min_requests`. After `cooldown` seconds it lets a
+    single probe request through: success closes it, failure opens it again.
+    """
+    def __init__(self, failure_rate=0.5, min_requests=5, window=20, cooldown=30.0):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._outcomes = deque(maxlen=window)
+        self._probing = False
+
+    def allow(self):
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record(self, success):
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if success:
+                self.state = CLOSED
+                self._outcomes.clear()
+            else:
+                self._open()
+            return
+
+        self._outcomes.append(success)
+        failures = sum(1 for outcome in self._outcomes if not outcome)
+        if len(self._outcomes) >= self.min_requests and failures / len(self._outcomes) >= self.failure_rate:
+            self._open()
+
+    def release(self):
+        """The request allowed through finished without an outcome, e.g. it was cancelled"""
+        self._probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+class HostHealth:
+    """
+    Circuit breaker and token bucket for every host the fetcher talks to,
+    shared by all fact-checks in the process. Only used from the fetcher's
+    event loop, so it needs no locking.
+    """
+    def __init__(self, rate=2.0, burst=4, failure_rate=0.5, min_requests=5, cooldown=30.0):
+        self.rate = rate
+        self.burst = burst
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self._hosts = {}
+
+    def get(self, host):
+        """Return (breaker, bucket) for a host"""
+        guard = self._hosts.get(host)
+        if guard is None:
+            guard = self._hosts[host] = (
+                CircuitBreaker(self.failure_rate, self.min_requests, cooldown=self.cooldown),
+                TokenBucket(self.rate, self.burst)
+            )
+        return guard
+
+    def states(self):
+        """{host: breaker state} for every host seen so far"""
+        return {host: breaker.state for host, (breaker, _) in list(self._hosts.items())}
+
+
+def is_failure(status_code):
+    """Responses that say the host is struggling rather than that the page is unusable"""
+    return status_code >= 500 or status_code == 429
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_JOBS_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs.db')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobStore:
+    """
+    SQLite table holding fact-check jobs.
+    It lives in its own local file so job state survives restarts no matter
+    which database SQLALCHEMY_DATABASE_URI points at.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fact_check_job (
+                    id TEXT PRIMARY KEY,
+                    claim TEXT NOT NULL,
+                    user_id INTEGER,
+                    admin_id INTEGER,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    worker_pid INTEGER,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_fact_check_job_status ON fact_check_job (status)')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def create(self, claim, user_id=None, admin_id=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO fact_check_job (id, claim, user_id, admin_id, status, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, claim, user_id, admin_id, QUEUED, now, now)
+            )
+        return job_id
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('SELECT * FROM fact_check_job WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def claim(self, job_id):
+        """Move a queued job to running. Returns False if another worker got there first."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'UPDATE fact_check_job SET status = ?, worker_pid = ?, updated_at = ? WHERE id = ? AND status = ?',
+                (RUNNING, os.getpid(), time.time(), job_id, QUEUED)
+            )
+            return cursor.rowcount == 1
+
+    def finish(self, job_id, result):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE fact_check_job SET status = ?, result = ?, updated_at = ? WHERE id = ?',
+                (DONE, json.dumps(result), time.time(), job_id)
+            )
+
+    def fail(self, job_id, error):
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE fact_check_job SET status = ?, error = ?, updated_at = ? WHERE id = ?',
+                (FAILED, error, time.time(), job_id)
+            )
+
+    def recover(self):
+        """
+        Put jobs orphaned by a dead process back in the queue and return the ids
+        of every queued job.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT id, worker_pid FROM fact_check_job WHERE status = ?', (RUNNING,)
+            ).fetchall()
+            for job_id, pid in rows:
+                if not _pid_alive(pid):
+                    conn.execute(
+                        'UPDATE fact_check_job SET status = ?, worker_pid = NULL, updated_at = ? WHERE id = ?',
+                        (QUEUED, time.time(), job_id)
+                    )
+            queued = conn.execute(
+                'SELECT id FROM fact_check_job WHERE status = ? ORDER BY created_at', (QUEUED,)
+            ).fetchall()
+        return [job_id for (job_id,) in queued]
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    if pid == os.getpid():
+        # Our own pid after a restart means the job belonged to a previous run
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+class JobQueue:
+    """
+    Background worker pool running fact-check jobs.
+
+    Web threads only insert a row and hand the id to the pool, so far more
+    users can be waiting on results than there are pipeline slots.
+    """
+    def __init__(self, app=None, runner=None):
+        self.app = None
+        self.runner = None
+        self.store = None
+        self.executor = None
+        self._started = False
+        self._lock = threading.Lock()
+        # Extra runner arguments that only live in memory, e.g. the articles a batch shares
+        self._options = {}
+        if app is not None:
+            self.init_app(app, runner)
+
+    def init_app(self, app, runner):
+        """
+        runner(claim, user_id=None, admin_id=None) is called inside an app context
+        and must return a JSON serializable result.
+        """
+        self.app = app
+        self.runner = runner
+        self.store = JobStore(app.config.get('FACT_CHECK_JOBS_DB') or DEFAULT_JOBS_DB)
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(app.config.get('FACT_CHECK_WORKERS') or 2),
+            thread_name_prefix='fact-check'
+        )
+        app.extensions['fact_check_jobs'] = self
+        # Recovery waits for the first request so CLI commands like `flask db upgrade`
+        # don't start running old jobs
+        app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for job_id in self.store.recover():
+                self.executor.submit(self._run, job_id)
+
+    def submit(self, claim, user_id=None, admin_id=None, **options):
+        """Queue a claim; options are passed on to the runner, but not to a job recovered after a restart"""
+        job_id = self.store.create(claim, user_id=user_id, admin_id=admin_id)
+        if options:
+            self._options[job_id] = options
+        self.executor.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _run(self, job_id):
+        options = self._options.pop(job_id, {})
+        if not self.store.claim(job_id):
+            return
+
+        job = self.store.get(job_id)
+        try:
+            with self.app.app_context():
+                result = self.runner(job['claim'], user_id=job['user_id'], admin_id=job['admin_id'], **options)
+            self.store.finish(job_id, result)
+        except Exception as e:
+            print(f"Error in fact-check job {job_id}: {str(e)}")
+            self.store.fail(job_id, str(e))
+
+
+job_queue = JobQueue()
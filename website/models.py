@@ -7,6 +7,7 @@ class RAGQuery(db.Model):
     question = db.Column(db.String(300))
     context = db.Column(db.Text)
     output = db.Column(db.Text)
+    metrics = db.Column(db.JSON)
     date = db.Column(db.DateTime(timezone=True), default=func.now())
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     admin_id = db.Column(db.Integer, db.ForeignKey('admin.id'), nullable=True)
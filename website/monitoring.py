@@ -0,0 +1,225 @@
+import time
+from urllib.parse import urlparse
+from flask import Blueprint, Response, g, request
+from prometheus_client import REGISTRY, CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from .pipeline import add_observer
+
+monitoring = Blueprint('monitoring', __name__)
+
+# Fact-checks take minutes, so the buckets go well past the prometheus defaults
+LONG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+REQUEST_LATENCY = Histogram(
+    'factfinder_http_request_duration_seconds',
+    'HTTP request latency by endpoint',
+    ['endpoint', 'method', 'status'],
+    buckets=LONG_BUCKETS
+)
+STAGE_DURATION = Histogram(
+    'factfinder_pipeline_stage_duration_seconds',
+    'Time spent in each pipeline stage, excluding nested stages',
+    ['stage'],
+    buckets=LONG_BUCKETS
+)
+PIPELINE_DURATION = Histogram(
+    'factfinder_pipeline_duration_seconds',
+    'Wall time of a whole fact-check run',
+    buckets=LONG_BUCKETS
+)
+PIPELINES_IN_FLIGHT = Gauge(
+    'factfinder_pipelines_in_flight',
+    'Fact-check runs currently in progress'
+)
+SCRAPES = Counter(
+    'factfinder_scrapes_total',
+    'Scraped pages by domain and outcome',
+    ['domain', 'outcome']
+)
+SCRAPED_BYTES = Counter(
+    'factfinder_scraped_bytes_total',
+    'Bytes downloaded while scraping pages'
+)
+OPENAI_LATENCY = Histogram(
+    'factfinder_openai_request_duration_seconds',
+    'Latency of OpenAI chat and embedding calls',
+    ['api', 'agent'],
+    buckets=LONG_BUCKETS
+)
+OPENAI_TOKENS = Counter(
+    'factfinder_openai_tokens_total',
+    'Tokens sent to and received from OpenAI',
+    ['api', 'agent', 'direction']
+)
+
+# Objects with a stats() method returning hits and misses, see register_cache()
+_caches = {}
+_collectors_registered = False
+
+
+def register_cache(name, cache):
+    """Expose the hit and miss counts of a cache on /metrics under its name"""
+    _caches[name] = cache
+
+
+class CacheCollector:
+    """Reads hit and miss counts from the registered caches on every scrape"""
+    def _families(self):
+        return (
+            CounterMetricFamily('factfinder_cache_hits', 'Cache hits', labels=['cache']),
+            CounterMetricFamily('factfinder_cache_misses', 'Cache misses', labels=['cache']),
+            GaugeMetricFamily('factfinder_cache_hit_ratio', 'Share of lookups that were hits', labels=['cache'])
+        )
+
+    def describe(self):
+        return self._families()
+
+    def collect(self):
+        hits, misses, ratio = self._families()
+        for name, cache in list(_caches.items()):
+            stats = cache.stats()
+            lookups = stats['hits'] + stats['misses']
+            hits.add_metric([name], stats['hits'])
+            misses.add_metric([name], stats['misses'])
+            ratio.add_metric([name], stats['hits'] / lookups if lookups else 0.0)
+        yield hits
+        yield misses
+        yield ratio
+
+
+class ChromaCollector:
+    """Reports the number of records in each Chroma collection on every scrape"""
+    def __init__(self, persist_directory='./chroma_db'):
+        self.persist_directory = persist_directory
+        self._client = None
+
+    def _family(self):
+        return GaugeMetricFamily(
+            'factfinder_chroma_collection_records', 'Records in each Chroma collection', labels=['collection']
+        )
+
+    def describe(self):
+        # Lets the registry check names without opening the Chroma client
+        yield self._family()
+
+    def collect(self):
+        size = self._family()
+        try:
+            if self._client is None:
+                import chromadb
+                self._client = chromadb.PersistentClient(path=self.persist_directory)
+            for collection in self._client.list_collections():
+                size.add_metric([collection.name], collection.count())
+        except Exception as e:
+            print(f"Error collecting Chroma metrics: {str(e)}")
+        yield size
+
+
+class HostHealthCollector:
+    """Reports the scraper's circuit breaker state for every host on every scrape"""
+    STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+    def _family(self):
+        return GaugeMetricFamily(
+            'factfinder_scraper_circuit_state', 'Circuit breaker per host: 0 closed, 1 half open, 2 open',
+            labels=['domain']
+        )
+
+    def describe(self):
+        yield self._family()
+
+    def collect(self):
+        from .scraper import fetcher
+
+        state = self._family()
+        for host, breaker_state in fetcher.hosts.states().items():
+            state.add_metric([_domain(f"http://{host}")], self.STATES[breaker_state])
+        yield state
+
+
+class EmbeddingBatchCollector:
+    """Reports how many OpenAI embedding calls the batcher made and the texts they carried"""
+    def _families(self):
+        return (
+            CounterMetricFamily('factfinder_embedding_batches', 'Embedding calls sent to OpenAI by the batcher'),
+            CounterMetricFamily('factfinder_embedding_batched_texts', 'Texts sent in the batcher\'s embedding calls')
+        )
+
+    def describe(self):
+        yield from self._families()
+
+    def collect(self):
+        from .embeddings import embedding_batcher
+
+        batches, texts = self._families()
+        stats = embedding_batcher.stats()
+        batches.add_metric([], stats['batches'])
+        texts.add_metric([], stats['texts'])
+        yield batches
+        yield texts
+
+
+class PipelineMetrics:
+    """Pipeline observer feeding the stage, scrape and OpenAI metrics"""
+    def run_started(self, run):
+        PIPELINES_IN_FLIGHT.inc()
+
+    def run_finished(self, run):
+        PIPELINES_IN_FLIGHT.dec()
+        PIPELINE_DURATION.observe(time.perf_counter() - run.started)
+
+    def stage_finished(self, run, record):
+        name = record['stage']
+        STAGE_DURATION.labels(name).observe(record['self_seconds'])
+
+        if name == 'scrape_content':
+            SCRAPES.labels(_domain(record['url']), 'success' if record.get('ok') else 'failure').inc()
+            SCRAPED_BYTES.inc(record.get('bytes', 0))
+        elif name == 'llm_call':
+            OPENAI_LATENCY.labels('chat', record['agent']).observe(record['seconds'])
+            OPENAI_TOKENS.labels('chat', record['agent'], 'prompt').inc(record.get('prompt_tokens', 0))
+            OPENAI_TOKENS.labels('chat', record['agent'], 'completion').inc(record.get('completion_tokens', 0))
+        elif name == 'openai_embeddings':
+            OPENAI_LATENCY.labels('embeddings', '').observe(record['seconds'])
+            OPENAI_TOKENS.labels('embeddings', '', 'prompt').inc(record.get('tokens', 0))
+
+
+def _domain(url):
+    host = urlparse(url).hostname or 'unknown'
+    return host[4:] if host.startswith('www.') else host
+
+
+@monitoring.record_once
+def _register_collectors(state):
+    # The registry is process wide, so only register once even if several apps are created
+    global _collectors_registered
+    if _collectors_registered:
+        return
+    _collectors_registered = True
+    add_observer(PipelineMetrics())
+    REGISTRY.register(CacheCollector())
+    REGISTRY.register(ChromaCollector())
+    REGISTRY.register(HostHealthCollector())
+    REGISTRY.register(EmbeddingBatchCollector())
+
+
+@monitoring.before_app_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+@monitoring.after_app_request
+def _observe_request(response):
+    started = g.pop('request_started', None)
+    # Streamed responses are timed until the headers go out
+    if started is not None and request.endpoint != 'monitoring.metrics':
+        REQUEST_LATENCY.labels(
+            request.endpoint or 'unmatched', request.method, str(response.status_code)
+        ).observe(time.perf_counter() - started)
+    return response
+
+
+@monitoring.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(generate_latest(REGISTRY), content_type=CONTENT_TYPE_LATEST)
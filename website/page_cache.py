@@ -0,0 +1,186 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_DIRECTORY = './page_cache'
+
+
+class PageCache:
+    """
+    Disk cache of the article text scraped from each URL.
+
+    Texts are stored in files named after their SHA-256, so pages with the same
+    text share a file, and a SQLite index maps each URL to its text along with
+    the ETag and Last-Modified headers it was served with. Entries younger than
+    `freshness` seconds are used as they are; older ones are revalidated with a
+    conditional GET. Once the texts take more than `max_bytes` the least
+    recently used URLs are evicted. A max_bytes of 0 turns the cache off.
+    """
+    def __init__(self, directory=DEFAULT_DIRECTORY, freshness=3600, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.freshness = freshness
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.directory = app.config.get('PAGE_CACHE_DIR') or self.directory
+        self.freshness = int(app.config.get('PAGE_CACHE_FRESHNESS', self.freshness))
+        self.max_bytes = int(app.config.get('PAGE_CACHE_MAX_BYTES', self.max_bytes))
+        app.extensions['page_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _connect(self):
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    os.makedirs(os.path.join(self.directory, 'texts'), exist_ok=True)
+                    with sqlite3.connect(os.path.join(self.directory, 'index.db'), timeout=30) as conn:
+                        conn.execute('PRAGMA journal_mode=WAL')
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS page (
+                                url TEXT PRIMARY KEY,
+                                digest TEXT NOT NULL,
+                                size INTEGER NOT NULL,
+                                etag TEXT,
+                                last_modified TEXT,
+                                fetched_at REAL NOT NULL,
+                                used_at REAL NOT NULL
+                            )
+                        """)
+                        conn.execute('CREATE INDEX IF NOT EXISTS ix_page_used_at ON page (used_at)')
+                    self._ready = True
+        conn = sqlite3.connect(os.path.join(self.directory, 'index.db'), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _text_path(self, digest):
+        return os.path.join(self.directory, 'texts', digest[:2], f"{digest}.txt")
+
+    def lookup(self, url):
+        """
+        Return the cached entry for a URL with its text, or None. Counts a hit
+        if the entry is still fresh and a miss otherwise.
+        """
+        if not self.enabled:
+            return None
+
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM page WHERE url = ?', (url,)).fetchone()
+            if row is not None:
+                conn.execute('UPDATE page SET used_at = ? WHERE url = ?', (time.time(), url))
+
+        entry = None
+        if row is not None:
+            try:
+                with open(self._text_path(row['digest']), encoding='utf-8') as f:
+                    entry = dict(row, text=f.read())
+            except OSError:
+                entry = None
+
+        with self._lock:
+            if self.is_fresh(entry):
+                self.hits += 1
+            else:
+                self.misses += 1
+        return entry
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry['fetched_at'] < self.freshness
+
+    def validators(self, entry):
+        """Headers for a conditional GET of a stale entry"""
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def revalidated(self, url):
+        """The server answered 304 Not Modified, so the stale lookup turned out to be a hit"""
+        with self._connect() as conn:
+            conn.execute('UPDATE page SET fetched_at = ? WHERE url = ?', (time.time(), url))
+        with self._lock:
+            self.hits += 1
+            self.misses -= 1
+
+    def store(self, url, text, etag=None, last_modified=None):
+        if not self.enabled:
+            return
+
+        data = text.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._text_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO page (url, digest, size, etag, last_modified, fetched_at, used_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (url, digest, len(data), etag, last_modified, now, now)
+            )
+        self.evict()
+
+    def evict(self):
+        """Drop the least recently used URLs until the texts fit in max_bytes"""
+        # Connect before taking the lock, which _connect takes itself the first time
+        with self._connect() as conn, self._lock:
+            total = conn.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM page GROUP BY digest)'
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+
+            removed = set()
+            for row in conn.execute('SELECT url, digest, size FROM page ORDER BY used_at').fetchall():
+                if total <= self.max_bytes:
+                    break
+                conn.execute('DELETE FROM page WHERE url = ?', (row['url'],))
+                shared = conn.execute('SELECT 1 FROM page WHERE digest = ? LIMIT 1', (row['digest'],)).fetchone()
+                if shared is None:
+                    total -= row['size']
+                    removed.add(row['digest'])
+
+        for digest in removed:
+            try:
+                os.remove(self._text_path(digest))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Forget every page, e.g. between benchmark runs"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM page')
+        shutil.rmtree(os.path.join(self.directory, 'texts'), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+def header(headers, name):
+    """Case-insensitive lookup in a plain dict of response headers"""
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+page_cache = PageCache()
@@ -0,0 +1,248 @@
+import time
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import wraps
+
+_local = threading.local()
+
+# Objects notified as runs start and finish and as stages complete, see add_observer()
+_observers = []
+
+
+def add_observer(observer):
+    """
+    Register an observer for every pipeline run in the process.
+
+    It may define run_started(run), run_finished(run) and
+    stage_finished(run, record); missing methods are skipped.
+    """
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+def _notify(method, *args):
+    for observer in _observers:
+        callback = getattr(observer, method, None)
+        if callback is None:
+            continue
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"Error in pipeline observer: {str(e)}")
+
+
+class PipelineRun:
+    """
+    State for a single fact-check while the crew is running.
+    The crew's tools look it up with current_run() and record what they did.
+
+    If a listener is given it is called as listener(event, data) every time a
+    stage reports progress, which is how the streaming endpoint follows a run.
+
+    Stages are timed with stage() and resources tallied with count(), and
+    metrics() summarises both for storing next to the RAGQuery.
+    """
+    def __init__(self, claim, listener=None, shared_articles=None):
+        self.claim = claim
+        self.listener = listener
+        self.shared_articles = shared_articles
+        self.evidence = []
+        self.documents = []
+        self.timeline = []
+        self.counters = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stacks = threading.local()
+
+    def emit(self, event, **data):
+        if self.listener is None:
+            return
+        try:
+            self.listener(event, data)
+        except Exception as e:
+            print(f"Error in pipeline listener: {str(e)}")
+
+    def add_evidence(self, text):
+        if text and text not in self.evidence:
+            self.evidence.append(text)
+
+    def add_documents(self, documents):
+        """Keep the chunk Documents search_and_embed produced, so get_news can search them without scraping again"""
+        with self._lock:
+            seen = {(doc.metadata.get('url'), doc.page_content) for doc in self.documents}
+            for doc in documents:
+                key = (doc.metadata.get('url'), doc.page_content)
+                if key not in seen:
+                    seen.add(key)
+                    self.documents.append(doc)
+
+    @property
+    def context(self):
+        return "\n".join(self.evidence)
+
+    @contextmanager
+    def stage(self, name, **details):
+        """
+        Time the block as a stage of the run.
+
+        Yields the stage's record so the block can add details such as byte or
+        chunk counts. Stages can nest: self_seconds leaves out the time spent in
+        stages started inside the block on the same thread.
+        """
+        stack = getattr(self._stacks, 'stack', None)
+        if stack is None:
+            stack = self._stacks.stack = []
+
+        record = {'stage': name, 'offset': round(time.perf_counter() - self.started, 4), **details}
+        children = [0.0]
+        stack.append(children)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - started
+            stack.pop()
+            if stack:
+                stack[-1][0] += seconds
+            record['seconds'] = round(seconds, 4)
+            record['self_seconds'] = round(seconds - children[0], 4)
+            with self._lock:
+                self.timeline.append(record)
+            _notify('stage_finished', self, record)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def metrics(self):
+        """Per-stage totals, per-agent LLM usage, counters and the raw timeline"""
+        with self._lock:
+            timeline = sorted(self.timeline, key=lambda record: record['offset'])
+            counters = dict(self.counters)
+
+        stages = {}
+        agents = {}
+        for record in timeline:
+            totals = stages.setdefault(record['stage'], {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            totals['calls'] += 1
+            totals['seconds'] = round(totals['seconds'] + record['self_seconds'], 4)
+            totals['max_seconds'] = max(totals['max_seconds'], record['self_seconds'])
+
+            if record['stage'] == 'llm_call':
+                usage = agents.setdefault(record['agent'], {
+                    'calls': 0, 'seconds': 0.0, 'prompt_tokens': 0, 'completion_tokens': 0
+                })
+                usage['calls'] += 1
+                usage['seconds'] = round(usage['seconds'] + record['seconds'], 4)
+                usage['prompt_tokens'] += record.get('prompt_tokens', 0)
+                usage['completion_tokens'] += record.get('completion_tokens', 0)
+
+        return {
+            'total_seconds': round(time.perf_counter() - self.started, 4),
+            'stages': stages,
+            'agents': agents,
+            'counters': counters,
+            'timeline': timeline
+        }
+
+
+class SharedArticles:
+    """
+    URLs being scraped, split and embedded by a group of runs, such as the
+    claims of one batch. The first run to reach a URL does the work and the
+    others wait for its chunks instead of repeating it.
+    """
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def claim(self, url):
+        """
+        Return (future, owner) for a URL. If owner is True the caller must
+        set the future's result to the URL's chunk Documents once they are
+        embedded, or to None if it gave up on the URL before scraping it, so
+        waiters scrape it themselves. Otherwise it can wait on the future.
+        """
+        with self._lock:
+            future = self._futures.get(url)
+            if future is not None:
+                return future, False
+            future = self._futures[url] = Future()
+            return future, True
+
+
+def current_run():
+    """Return the PipelineRun active on this thread, or None"""
+    return getattr(_local, 'run', None)
+
+
+def emit(event, **data):
+    """Report progress to the active run's listener, if there is one"""
+    run = current_run()
+    if run is not None:
+        run.emit(event, **data)
+
+
+@contextmanager
+def stage(name, **details):
+    """Time the block as a stage of the active run. Yields a throwaway record when there is no run."""
+    run = current_run()
+    if run is None:
+        yield dict(details)
+        return
+
+    with run.stage(name, **details) as record:
+        yield record
+
+
+def count(name, amount=1):
+    """Add to a counter of the active run, if there is one"""
+    run = current_run()
+    if run is not None:
+        run.count(name, amount)
+
+
+def bind_run(fn):
+    """
+    Wrap fn so it runs with the caller's active run, for handing work to
+    thread pools whose threads would otherwise have no run.
+    """
+    run = current_run()
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        previous = current_run()
+        _local.run = run
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.run = previous
+
+    return wrapper
+
+
+@contextmanager
+def start_run(claim, listener=None, shared_articles=None):
+    """Make a new PipelineRun the active run on this thread for the duration of the block"""
+    previous = current_run()
+    run = PipelineRun(claim, listener=listener, shared_articles=shared_articles)
+    _local.run = run
+    _notify('run_started', run)
+    try:
+        yield run
+    finally:
+        _local.run = previous
+        _notify('run_finished', run)
+
+
+@contextmanager
+def ensure_run(claim):
+    """Use the run already active on this thread, or start a new one for the block"""
+    run = current_run()
+    if run is not None:
+        yield run
+        return
+
+    with start_run(claim) as run:
+        yield run
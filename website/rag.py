@@ -1,11 +1,163 @@
-from flask import Blueprint, request, jsonify
-from .rag_module import fact_check_crew, get_news
+import json
+import time
+import uuid
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, Response, current_app, request, jsonify
+from langchain_chroma import Chroma
+from .rag_module import run_fact_check, stream_fact_check
+from .resources import resources
+from .vector_store import collection_for_model
+from .pipeline import SharedArticles, start_run, stage
 from .models import RAGQuery, Admin
+from .jobs import job_queue
 from flask_login import login_required, current_user
 from . import db
 
 rag = Blueprint('rag', __name__)
 
+
+class ClaimCache:
+    """
+    Semantic cache of finished fact-checks.
+
+    Claims are embedded into their own Chroma collection, so a reworded
+    version of a claim checked within the TTL gets the stored result back
+    instead of paying for another crew run.
+    """
+    COLLECTION_NAME = 'claim_cache'
+
+    def __init__(self, app=None):
+        self.similarity_threshold = 0.92
+        self.ttl = 24 * 60 * 60
+        self.persist_directory = './chroma_db'
+        self.hits = 0
+        self.misses = 0
+        self._vector_store = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.similarity_threshold = app.config.get('CLAIM_CACHE_THRESHOLD', self.similarity_threshold)
+        self.ttl = app.config.get('CLAIM_CACHE_TTL', self.ttl)
+        app.extensions['claim_cache'] = self
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    @property
+    def vector_store(self):
+        if self._vector_store is None:
+            with self._lock:
+                if self._vector_store is None:
+                    self._vector_store = Chroma(
+                        collection_name=collection_for_model(self.COLLECTION_NAME, resources.embedding_model),
+                        embedding_function=resources.embeddings,
+                        persist_directory=self.persist_directory,
+                        collection_metadata={'hnsw:space': 'cosine'}
+                    )
+        return self._vector_store
+
+    def lookup(self, claim):
+        """Return the cached response for the most similar fresh claim, or None"""
+        if not self.enabled:
+            return None
+
+        try:
+            matches = self.vector_store.similarity_search_with_score(
+                claim, k=1, filter={'cached_at': {'$gte': time.time() - self.ttl}}
+            )
+        except Exception as e:
+            print(f"Error in claim cache lookup: {str(e)}")
+            matches = []
+
+        # The collection uses cosine distance
+        if matches and 1 - matches[0][1] >= self.similarity_threshold:
+            doc = matches[0][0]
+            self._count(hit=True)
+            return {
+                'context': doc.metadata['context'],
+                'output': json.loads(doc.metadata['output'])
+            }
+
+        self._count(hit=False)
+        return None
+
+    def store(self, claim, context, output):
+        if not self.enabled or 'error' in output:
+            return
+
+        try:
+            now = time.time()
+            self.vector_store.add_texts(
+                [claim],
+                metadatas=[{'context': context, 'output': json.dumps(output), 'cached_at': now}],
+                ids=[uuid.uuid4().hex]
+            )
+            self.vector_store.delete(where={'cached_at': {'$lt': now - self.ttl}})
+        except Exception as e:
+            print(f"Error in claim cache store: {str(e)}")
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'similarity_threshold': self.similarity_threshold,
+            'ttl': self.ttl
+        }
+
+
+claim_cache = ClaimCache()
+
+
+class StreamPool:
+    """
+    Bounded pool running the pipelines of streaming requests. A client can't
+    wait in a queue with its connection open, so once every worker is busy
+    further streams are turned away instead of starting more crew runs.
+    """
+    def __init__(self, app=None):
+        self.workers = 2
+        self.executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = int(app.config.get('FACT_CHECK_STREAM_WORKERS') or self.workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='fact-check-stream')
+        self._slots = threading.BoundedSemaphore(self.workers)
+        app.extensions['fact_check_streams'] = self
+
+    def try_submit(self, fn):
+        """Run fn on a free worker and return True, or return False if they are all busy"""
+        if not self._slots.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                fn()
+            finally:
+                self._slots.release()
+
+        self.executor.submit(run)
+        return True
+
+
+stream_pool = StreamPool()
+
 def serialize_crew_output(output):
     """
     Convert CrewOutput to JSON serializable format.
@@ -98,6 +250,55 @@ def format_final_answer(query, context, serialized_output):
         return f"Error in formatting response: {str(e)}"
     
 
+def fact_check_and_record(query, user_id=None, admin_id=None, listener=None, shared_articles=None):
+    """
+    Run the RAG pipeline for a claim, save it as a RAGQuery and return the
+    response body shared by the synchronous, job, streaming and batch endpoints.
+    Passing a listener streams progress and the analyst's tokens to it.
+    The per-stage timings and resource counts of the run are stored and
+    returned as metrics.
+    """
+    with start_run(query, listener=listener, shared_articles=shared_articles) as run:
+        with stage('claim_cache_lookup'):
+            cached = claim_cache.lookup(query)
+
+        if cached:
+            context = cached['context']
+            serialized_output = cached['output']
+        else:
+            # Get context and output from RAG pipeline
+            if listener is not None:
+                output, context = stream_fact_check(query)
+            else:
+                output, context = run_fact_check(query)
+
+            # Serialize the output to JSON-compatible format
+            serialized_output = serialize_crew_output(output)
+            claim_cache.store(query, context, serialized_output)
+
+    metrics = run.metrics()
+
+    # Save to the database
+    rag_query = RAGQuery(
+        question=query,
+        context=context,
+        output=str(serialized_output),
+        metrics=metrics,
+        user_id=user_id,
+        admin_id=admin_id
+    )
+    db.session.add(rag_query)
+    db.session.commit()
+
+    return {
+        'question': query,
+        'context': context,
+        'output': serialized_output,
+        'cached': cached is not None,
+        'metrics': metrics
+    }
+
+
 @rag.route('/process-query', methods=['GET', 'POST'])
 @login_required  
 def process_query():
@@ -110,32 +311,8 @@ def process_query():
 
         if not query:
             return jsonify({'error': 'Query is required'}), 400
-        
-
-        # Get context and output from RAG pipeline
-        output = fact_check_crew.kickoff(inputs={'claim': query})
-
-        context = get_news(query)
-
-        # Serialize the output to JSON-compatible format
-        serialized_output = serialize_crew_output(output)
 
-        # Save to the database (optional)
-        rag_query = RAGQuery(
-            question=query,
-            context=context,
-            output=str(serialized_output), 
-            user_id=current_user.id
-        )
-        db.session.add(rag_query)
-        db.session.commit()
-
-        # Prepare response
-        response = {
-            'question': query,
-            'context': context,
-            'output': serialized_output
-        }
+        response = fact_check_and_record(query, user_id=current_user.id)
 
         return jsonify(response), 200
 
@@ -165,30 +342,8 @@ def admin_process_query():
 
         if not query:
             return jsonify({'error': 'Query is required'}), 400
-        
-        # Get context and output from RAG pipeline
-        output = fact_check_crew.kickoff(inputs={'claim': query})
-        context = get_news(query)
-
-        # Serialize the output to JSON-compatible format
-        serialized_output = serialize_crew_output(output)
-
-        # Save to the database with admin_id
-        rag_query = RAGQuery(
-            question=query,
-            context=context,
-            output=str(serialized_output),  
-            admin_id=admin.id  
-        )
-        db.session.add(rag_query)
-        db.session.commit()
-
-        # Prepare response
-        response = {
-            'question': query,
-            'context': context,
-            'output': serialized_output
-        }
+
+        response = fact_check_and_record(query, admin_id=admin.id)
 
         return jsonify(response), 200
 
@@ -199,4 +354,190 @@ def admin_process_query():
         return jsonify({'error': str(e)}), 500
     
     finally:
-        db.session.close()
\ No newline at end of file
+        db.session.close()
+
+
+def _job_owner():
+    """Return (user_id, admin_id) for the logged in account"""
+    admin = Admin.query.filter_by(email=current_user.email).first()
+    if admin:
+        return None, admin.id
+    return current_user.id, None
+
+
+SSE_KEEPALIVE_SECONDS = 15
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@rag.route('/process-query/stream', methods=['POST'])
+@login_required
+def process_query_stream():
+    """
+    Streaming variant of process_query.
+
+    Sends Server-Sent Events as the pipeline runs: `search`, `scraped`,
+    `embedded` and `evidence` as each stage finishes, `token` for every piece
+    of the analyst's answer, then `result` with the usual response body
+    (or `error`). Answers 503 when every streaming worker is busy.
+    """
+    data = request.get_json() or {}
+    query = data.get('query', '')
+
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+
+    user_id, admin_id = _job_owner()
+    db.session.close()
+
+    app = current_app._get_current_object()
+    events = queue.Queue()
+
+    def run_pipeline():
+        try:
+            with app.app_context():
+                response = fact_check_and_record(
+                    query,
+                    user_id=user_id,
+                    admin_id=admin_id,
+                    listener=lambda event, data: events.put((event, data))
+                )
+            events.put(('result', response))
+        except Exception as e:
+            print(f"Error in process_query_stream: {str(e)}")
+            events.put(('error', {'error': str(e)}))
+        finally:
+            events.put(None)
+
+    if not stream_pool.try_submit(run_pipeline):
+        return jsonify({'error': 'Too many fact-checks are streaming, try again shortly or submit a job'}), 503
+
+    def generate():
+        while True:
+            try:
+                item = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+            except queue.Empty:
+                # Comment line so proxies don't drop the idle connection
+                yield ": keep-alive\n\n"
+                continue
+
+            if item is None:
+                break
+            yield _sse(*item)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@rag.route('/jobs', methods=['POST'])
+@login_required
+def submit_job():
+    """Queue a claim for fact-checking and return the job id straight away"""
+    try:
+        data = request.get_json() or {}
+        query = data.get('query', '')
+
+        if not query:
+            return jsonify({'error': 'Query is required'}), 400
+
+        user_id, admin_id = _job_owner()
+        job_id = job_queue.submit(query, user_id=user_id, admin_id=admin_id)
+
+        return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+
+    except Exception as e:
+        print(f"Error in submit_job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    finally:
+        db.session.close()
+
+
+@rag.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_job(job_id):
+    """Return the status of a fact-check job, and its result once it is done"""
+    try:
+        job = job_queue.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+
+        user_id, admin_id = _job_owner()
+        if (job['user_id'], job['admin_id']) != (user_id, admin_id):
+            return jsonify({'error': 'Unauthorized to view this job'}), 403
+
+        response = {
+            'job_id': job['id'],
+            'status': job['status'],
+            'question': job['claim']
+        }
+        if job['result'] is not None:
+            response['result'] = job['result']
+        if job['error']:
+            response['error'] = job['error']
+
+        return jsonify(response), 200
+
+    except Exception as e:
+        print(f"Error in get_job: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    finally:
+        db.session.close()
+
+
+@rag.route('/batch', methods=['POST'])
+@login_required
+def batch_process_queries():
+    """
+    Queue a list of claims as fact-check jobs.
+
+    The claims run on the job queue's worker pool like any other job, and
+    share their scraping, so a URL that turns up for several claims is
+    scraped, split and embedded once. Returns a job id for every claim, in
+    the order they were sent, to poll at /rag/jobs/<job_id>.
+    """
+    try:
+        data = request.get_json() or {}
+        claims = data.get('claims')
+
+        if not isinstance(claims, list) or not claims:
+            return jsonify({'error': 'A list of claims is required'}), 400
+
+        if not all(isinstance(claim, str) and claim.strip() for claim in claims):
+            return jsonify({'error': 'Claims must be non-empty strings'}), 400
+
+        max_claims = current_app.config['FACT_CHECK_BATCH_MAX_CLAIMS']
+        if len(claims) > max_claims:
+            return jsonify({'error': f'At most {max_claims} claims can be checked in one batch'}), 400
+
+        user_id, admin_id = _job_owner()
+        shared_articles = SharedArticles()
+
+        # Repeated claims are only checked once
+        job_ids = {}
+        for claim in dict.fromkeys(claims):
+            job_ids[claim] = job_queue.submit(
+                claim, user_id=user_id, admin_id=admin_id, shared_articles=shared_articles
+            )
+
+        return jsonify({
+            'jobs': [{'job_id': job_ids[claim], 'question': claim, 'status': 'queued'} for claim in claims]
+        }), 202
+
+    except Exception as e:
+        print(f"Error in batch_process_queries: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    finally:
+        db.session.close()
+
+
+@rag.route('/cache/stats', methods=['GET'])
+@login_required
+def cache_stats():
+    """Hit and miss counts of the claim cache, for tuning its threshold"""
+    return jsonify(claim_cache.stats()), 200
@@ -20,6 +20,7 @@ def get_all_queries():
                 'question': query.question,
                 'context': query.context,
                 'output': query.output,
+                'metrics': query.metrics,
                 'date': query.date,
                 'user_id': query.user_id,
                 'admin_id': query.admin_id
@@ -93,6 +94,7 @@ def search_queries():
                 'question': query.question,
                 'context': query.context,
                 'output': query.output,
+                'metrics': query.metrics,
                 'date': query.date,
                 'user_id': query.user_id,
                 'admin_id': query.admin_id
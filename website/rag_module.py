@@ -1,21 +1,29 @@
 import os
+import time
 import torch
 from dotenv import load_dotenv
 from crewai.tools import tool
 from duckduckgo_search import DDGS
 from crewai import Agent, Task, Crew
 from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
 from transformers import BertTokenizer, BertModel
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.retrievers.document_compressors import LLMChainExtractor
 from langchain.schema import Document
-from langchain_chroma import Chroma
+from langchain_core.messages import AIMessageChunk
 from langchain_community.retrievers import BM25Retriever
 from langchain.retrievers import ContextualCompressionRetriever, EnsembleRetriever
-import requests
-from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from .pipeline import current_run, ensure_run, emit, stage, count
+from .tokens import count_tokens, count_message_tokens
+from .replay import replay
+from .scraper import FetchedPage
+from .page_cache import page_cache, header
+from .extract import extract_article_text
+from .search_cache import search_cache
+from .source_policy import source_policy
+from .dedup import dedupe_articles, dedupe_documents
+from .chunking import SentenceChunker
+from .vector_store import upsert_documents
+from .resources import resources
 
 # Set up api variables
 
@@ -24,6 +32,17 @@ load_dotenv()
 # os.environ['SERPER_API_KEY'] = os.getenv('SERPER_API_KEY')
 os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 
+# search_and_embed asks DuckDuckGo for SEARCH_CANDIDATES links, scrapes them all at once and
+# keeps the first ARTICLES_PER_CLAIM usable articles, giving up on the rest after SCRAPE_DEADLINE seconds
+SEARCH_CANDIDATES = int(os.getenv('SEARCH_CANDIDATES', 6))
+ARTICLES_PER_CLAIM = int(os.getenv('ARTICLES_PER_CLAIM', 3))
+SCRAPE_DEADLINE = float(os.getenv('SCRAPE_DEADLINE', 8))
+
+# Articles are split into chunks of whole sentences up to CHUNK_TOKENS tokens of the embedding model,
+# repeating up to CHUNK_OVERLAP_TOKENS tokens of trailing sentences from the chunk before
+CHUNK_TOKENS = int(os.getenv('CHUNK_TOKENS', 128))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 16))
+
 # Initialize LLM
 llm = ChatOpenAI(
     model_name='gpt-4o-mini',
@@ -34,83 +53,158 @@ llm = ChatOpenAI(
 # Web Scraping function
 def duckduckgo_search(query, num_results=5):
     """Perform DuckDuckGo search and return top results"""
-    with DDGS() as ddgs:
-        results = ddgs.text(query, backend='html')
-        links = []
-        for result in results:
-            if len(links) >= num_results:
-                break
-            links.append({
-                'url': result['href'],
-                'title': result.get('title', 'No title')
-            })
+    with stage('duckduckgo_search', query=query) as record:
+        # Recorded and replayed runs skip the cache, so every search is in the cassette
+        results = None if replay.active else search_cache.get(query)
+        record['cached'] = results is not None
+        if results is None:
+            results = [
+                {'url': result['href'], 'title': result.get('title', 'No title')}
+                for result in replay.call('search', {'query': query, 'backend': 'html'}, lambda: _ddgs_text(query))
+            ]
+            if not replay.active:
+                search_cache.put(query, results)
+
+        # Sources the analyst may not cite and known paywalls are dropped before anything is fetched
+        results, skipped = source_policy.filter(results)
+        if skipped:
+            record['skipped'] = [{'url': link['url'], 'verdict': verdict} for link, verdict in skipped]
+            count('sources_skipped', len(skipped))
+
+        links = results[:num_results]
+        record['results'] = len(links)
         return links
 
-def scrape_content(link):
-    try:
-        response = requests.get(link)
-        response.encoding = 'utf-8'
+def _ddgs_text(query):
+    with DDGS() as ddgs:
+        return list(ddgs.text(query, backend='html'))
 
-        # Check for paywall indicators in meta tag
-        if 'paywall' in response.text.lower():
-            print(f"Paywall detected for {link}")
-            return None
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
+def scrape_content(link, download=None, cached=None):
+    """
+    Scrape the article text of a page, or return None.
+    download is the fetcher's Future for the page if it was already started,
+    and cached the page cache entry scrape_links looked up for it.
+    """
+    with stage('scrape_content', url=link) as record:
+        content = _scrape_content(link, record, download, cached)
+        record['ok'] = content is not None
+    count('pages_scraped' if content else 'pages_failed')
+    return content
 
-        main_content = soup.find('main') or soup.find('article') or soup.find('body')
+def _scrape_content(link, record, download=None, cached=None):
+    try:
+        if page_cache.is_fresh(cached):
+            record['cache'] = 'hit'
+            count('page_cache_hits')
+            return cached['text']
+
+        if download is None and not replay.replaying:
+            download = resources.fetcher.submit(link, headers=page_cache.validators(cached))
+        response = replay.call(
+            'page', {'url': link}, lambda: download.result(),
+            encode=FetchedPage.to_dict, decode=FetchedPage.from_dict
+        )
+        record['fetch_seconds'] = round(response.seconds, 4)
+        record['bytes'] = len(response.content)
+        count('bytes_downloaded', len(response.content))
+
+        if response.status_code == 304 and cached is not None:
+            page_cache.revalidated(link)
+            record['cache'] = 'revalidated'
+            count('page_cache_hits')
+            return cached['text']
+        record['cache'] = 'miss'
+
+        # The fetcher drops paywalled and non-HTML pages as soon as it sees them
+        if response.rejected:
+            print(f"Skipping {link}: {response.rejected}")
+            record['rejected'] = response.rejected
+            return None
+        if response.truncated:
+            record['truncated'] = True
+            count('pages_truncated')
         
-        if main_content:
-            paragraphs = main_content.find_all('p')
-        else:
-            paragraphs = soup.find_all('p')
+        with stage('extract_text', url=link):
+            article_text = extract_article_text(response.text)
+        if not article_text:
+            return None
 
-        article_text = ' '.join([p.get_text(strip=True) for p in paragraphs])
-        return article_text if article_text else None
+        page_cache.store(
+            link, article_text,
+            etag=header(response.headers, 'ETag'), last_modified=header(response.headers, 'Last-Modified')
+        )
+        return article_text
     except Exception as e:
         print(f"Error scraping {link}: {e}")
         return None
 
 # Search and Embed Tool function
 
-def search_and_embed(query: str):
+def scrape_links(links, wanted=None, deadline=None, finished=None):
     """
-    Search the web, scrape content and store embeddings
-    """
-    try:
-        results = duckduckgo_search(query, num_results=3)
-        if not results:
-            return "No results found"
+    Scrape a list of {'url', 'title'} links concurrently and return the articles that had content.
 
-        links = [{'url': res['url'], 'title': res['title']} for res in results]
-        
-        scraped_articles = []
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_link = {executor.submit(scrape_content, link['url']): link for link in links}
-            for future in as_completed(future_to_link):
-                link = future_to_link[future]
-                try:
-                    content = future.result()
-                    if content:
-                        scraped_articles.append({
-                            'url': link['url'],
-                            'title': link['title'],
-                            'content': content
-                        })
-                except Exception as e:
-                    print(f"Error scraping {link['url']}: {e}")
-
-        if not scraped_articles:
-            return "No content could be scraped from the articles"
-
-        documents = []
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=512, 
-            chunk_overlap=200, 
-            length_function=len
-        )
-        
-        for article in scraped_articles:
+    With wanted, scraping stops as soon as that many articles are in, and with
+    deadline it stops after that many seconds. Downloads still running then
+    are cancelled, so slow or failing sites don't hold up the claim. The URLs
+    that were scraped, with or without content, are added to the finished set.
+    """
+    # Every download is started before the first is parsed, so they all share the fetcher's pool.
+    # Recorded and replayed runs skip the page cache, so every page is in the cassette.
+    cached_pages = [None if replay.active else page_cache.lookup(link['url']) for link in links]
+    downloads = [
+        None if replay.replaying or page_cache.is_fresh(cached)
+        else resources.fetcher.submit(link['url'], headers=page_cache.validators(cached))
+        for link, cached in zip(links, cached_pages)
+    ]
+
+    with stage('scrape_links', candidates=len(links)) as record:
+        started = time.monotonic()
+        articles = {}
+        remaining = list(range(len(links)))
+        while remaining and (wanted is None or len(articles) < wanted):
+            # Cached and replayed pages are ready straight away, downloads once they finish
+            ready = [i for i in remaining if downloads[i] is None or downloads[i].done()]
+            if not ready:
+                timeout = None if deadline is None else deadline - (time.monotonic() - started)
+                if timeout is not None and timeout <= 0:
+                    break
+                wait([downloads[i] for i in remaining], timeout=timeout, return_when=FIRST_COMPLETED)
+                continue
+
+            for i in ready:
+                remaining.remove(i)
+                content = scrape_content(links[i]['url'], downloads[i], cached_pages[i])
+                if finished is not None:
+                    finished.add(links[i]['url'])
+                if content:
+                    articles[i] = {
+                        'url': links[i]['url'],
+                        'title': links[i]['title'],
+                        'content': content
+                    }
+                if wanted is not None and len(articles) >= wanted:
+                    break
+
+        for i in remaining:
+            if downloads[i] is not None:
+                downloads[i].cancel()
+        record['articles'] = len(articles)
+        record['abandoned'] = len(remaining)
+    count('pages_abandoned', len(remaining))
+
+    # Link order, whichever page finished first, so the chunks come out the same from run to run
+    return [articles[i] for i in sorted(articles)]
+
+def split_articles(articles):
+    """Split scraped articles into chunk Documents"""
+    documents = []
+    text_splitter = SentenceChunker(
+        CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, model=resources.embedding_model, tokenizer=resources.embedding_tokenizer
+    )
+    
+    with stage('text_splitting', articles=len(articles)) as record:
+        for article in articles:
             chunks = text_splitter.split_text(article['content'])
             for chunk in chunks:
                 documents.append(
@@ -119,16 +213,116 @@ def search_and_embed(query: str):
                         metadata={
                             'title': article['title'],
                             'url': article['url'],
+                            'sources': ' '.join(article.get('urls', [article['url']])),
                             'source': 'Web scrape'
                         }
                     )
                 )
+        record['chunks'] = len(documents)
+    count('chunks', len(documents))
+    return documents
+
+def embed_links(links, wanted, finished=None):
+    """
+    Scrape up to `wanted` articles from links, collapse duplicates and store
+    their chunks. Returns (scraped articles, chunk Documents).
+    """
+    scraped_articles = scrape_links(links, wanted=wanted, deadline=SCRAPE_DEADLINE, finished=finished)
+    emit('scraped', articles=[
+        {'url': article['url'], 'title': article['title'], 'characters': len(article['content'])}
+        for article in scraped_articles
+    ])
+
+    # Syndicated copies of a story would otherwise be split, embedded and shown to the analyst once per site
+    with stage('dedup_articles', articles=len(scraped_articles)) as record:
+        articles = dedupe_articles(scraped_articles)
+        record['duplicates'] = len(scraped_articles) - len(articles)
+    count('duplicate_articles', record['duplicates'])
+
+    chunks = split_articles(articles)
+    with stage('dedup_chunks', chunks=len(chunks)) as record:
+        documents = dedupe_documents(chunks)
+        record['duplicates'] = len(chunks) - len(documents)
+    count('duplicate_chunks', record['duplicates'])
+
+    if documents:
+        upsert_documents(documents, resources.news_store)
+    emit('embedded', chunks=len(documents))
+    return scraped_articles, documents
+
+def search_and_embed(query: str):
+    """
+    Search the web, scrape content and store embeddings
+    """
+    try:
+        results = duckduckgo_search(query, num_results=SEARCH_CANDIDATES)
+        if not results:
+            return "No results found"
+
+        links = [{'url': res['url'], 'title': res['title']} for res in results]
+        emit('search', results=links)
+
+        # In a batch, other claims may already be scraping and embedding some of these URLs.
+        # We only do the work for the URLs we claim and reuse the chunks of the rest.
+        run = current_run()
+        shared_articles = run.shared_articles if run is not None else None
+        owned_links, shared_links = [], []
+        for link in links:
+            if shared_articles is None:
+                owned_links.append((link, None))
+                continue
+            future, owner = shared_articles.claim(link['url'])
+            (owned_links if owner else shared_links).append((link, future))
+
+        # Only pages another claim has already embedded count towards the articles we want,
+        # since it may still give up on the ones it is working on
+        shared_ready = sum(1 for _, future in shared_links if future.done() and future.result())
+
+        scraped_articles = []
+        documents = []
+        finished = set()
+        embedded = False
+        try:
+            scraped_articles, documents = embed_links(
+                [link for link, _ in owned_links],
+                wanted=max(ARTICLES_PER_CLAIM - shared_ready, 1),
+                finished=finished
+            )
+            embedded = True
+        finally:
+            # Always publish, even on failure, so other claims never wait forever.
+            # Pages we never got to are published as None and the waiters scrape them themselves.
+            for link, future in owned_links:
+                if future is not None:
+                    future.set_result(
+                        [doc for doc in documents if link['url'] in doc.metadata['sources'].split()]
+                        if embedded and link['url'] in finished else None
+                    )
+
+        unscraped = []
+        shared_articles_found = 0
+        for link, future in shared_links:
+            shared = future.result()
+            if shared is None:
+                unscraped.append(link)
+            else:
+                documents.extend(shared)
+                shared_articles_found += bool(shared)
+
+        missing = ARTICLES_PER_CLAIM - len(scraped_articles) - shared_articles_found
+        if unscraped and missing > 0:
+            more_articles, more_documents = embed_links(unscraped, wanted=missing)
+            scraped_articles += more_articles
+            documents += more_documents
+
+        if not scraped_articles and not documents:
+            return "No content could be scraped from the articles"
+
         if not documents:
             return "No documents could be processed"
 
-        embeddings = OpenAIEmbeddings(model='text-embedding-3-small')
-        vector_store = Chroma.from_documents(documents, embedding=embeddings, persist_directory='./chroma_db')
-        
+        if run is not None:
+            run.add_documents(documents)
         return documents
 
     except Exception as e:
@@ -207,6 +401,11 @@ def batch_rerank_documents(query, docs, embeddings_filter, tokenizer, model, bat
 
     return sorted(scores, key=lambda x: x[0], reverse=True)
 
+def _also_published_at(metadata):
+    """Line listing the other sites carrying a chunk that was collapsed as a duplicate"""
+    others = [url for url in metadata.get('sources', '').split() if url != metadata.get('url')]
+    return f"Also published at: {', '.join(others)}\n" if others else ""
+
 def get_news(query: str) -> str:
     """
     Search the vector store for relevant information that addresses the query.
@@ -218,18 +417,22 @@ def get_news(query: str) -> str:
         str: Formatted results from the search
     """
     try:
-        embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        vector_store = Chroma(persist_directory="./chroma_db", embedding_function=embeddings)
+        embeddings = resources.embeddings
+        vector_store = resources.news_store
 
         vectorstore_retriever = vector_store.as_retriever(
             search_type="mmr", search_kwargs={"k": 3, "fetch_k": 20, "lambda_mult": 0.7}
         )
 
-        keyword_retriever = BM25Retriever.from_documents(
-            search_and_embed(query), k=3
-        )
+        # The Research_Agent has normally run search_and_embed for this claim already
+        run = current_run()
+        keyword_documents = list(run.documents) if run is not None and run.documents else search_and_embed(query)
+        with stage('bm25_index', documents=len(keyword_documents)):
+            keyword_retriever = BM25Retriever.from_documents(
+                keyword_documents, k=3
+            )
 
-        compressor = LLMChainExtractor.from_llm(llm)
+        compressor = resources.compressor(llm)
         compression_retriever = ContextualCompressionRetriever(
             base_compressor=compressor, base_retriever=vectorstore_retriever
         )
@@ -251,21 +454,27 @@ def get_news(query: str) -> str:
             weights=[0.7, 0.3]
         )
 
-        retrieved_docs = ensemble_retriever.invoke(query)
+        # Same as ensemble_retriever.invoke(query), but each retriever is timed on its own
+        with stage('chroma_read'):
+            vector_docs = vectorstore_retriever.invoke(query)
+        with stage('bm25_search'):
+            keyword_docs = keyword_retriever.invoke(query)
+        retrieved_docs = ensemble_retriever.weighted_reciprocal_rank([vector_docs, keyword_docs])
 
         embeddings_filter = EmbeddingsFilter(
             embeddings=embeddings,
             similarity_threshold=0.75
         )
 
-        reranked_docs = batch_rerank_documents(
-            query=query,
-            docs=retrieved_docs,
-            embeddings_filter=embeddings_filter,
-            tokenizer=tokenizer,
-            model=model,
-            batch_size=16
-        )
+        with stage('batch_rerank_documents', documents=len(retrieved_docs)):
+            reranked_docs = batch_rerank_documents(
+                query=query,
+                docs=retrieved_docs,
+                embeddings_filter=embeddings_filter,
+                tokenizer=tokenizer,
+                model=model,
+                batch_size=16
+            )
 
         results_text = []
         for score, doc in reranked_docs[:5]:
@@ -274,12 +483,23 @@ def get_news(query: str) -> str:
                 f"Score: {score:.4f}\n"
                 f"Title: {metadata.get('title', 'No title')}\n"
                 f"URL: {metadata.get('url', 'No URL')}\n"
+                f"{_also_published_at(metadata)}"
                 f"Content: {doc.page_content}\n"
                 "-------------------\n"
             )
             results_text.append(result)
 
-        return "\n".join(results_text)
+        news = "\n".join(results_text)
+        emit('evidence', results=[
+            {'score': round(score, 4), 'title': doc.metadata.get('title', 'No title'), 'url': doc.metadata.get('url', 'No URL')}
+            for score, doc in reranked_docs[:5]
+        ])
+
+        # Keep what the retriever actually saw so the caller can return it as context
+        if run is not None:
+            run.add_evidence(news)
+
+        return news
 
     except Exception as e:
         import traceback
@@ -490,4 +710,102 @@ fact_check_crew = Crew(
    agents=[Research_Agent, Retriever_Agent, Analyst_Agent],
    tasks=[research_task, retrieval_task, analysis_task],
    verbose=True, 
-)
\ No newline at end of file
+)
+
+# Research and retrieval only, the streaming variant runs the analysis itself
+evidence_crew = Crew(
+   agents=[Research_Agent, Retriever_Agent],
+   tasks=[research_task, retrieval_task],
+   verbose=True,
+)
+
+def time_llm_calls(crew):
+    """
+    Record every LLM call of the crew's agents as an `llm_call` stage of the
+    active run, with the agent's role and the prompt and completion tokens.
+    Only use it on a copy of a crew since it patches the agents' LLMs.
+    """
+    for agent in crew.agents:
+        agent.llm.call = _timed_llm_call(agent.role, agent.llm)
+
+def _timed_llm_call(role, agent_llm):
+    call = agent_llm.call
+
+    def timed_call(messages, *args, **kwargs):
+        with stage('llm_call', agent=role, prompt_tokens=count_message_tokens(messages, agent_llm.model)) as record:
+            response = replay.call(
+                'chat', {'model': agent_llm.model, 'messages': messages},
+                lambda: call(messages, *args, **kwargs)
+            )
+            record['completion_tokens'] = count_tokens(response, agent_llm.model)
+        count('prompt_tokens', record['prompt_tokens'])
+        count('completion_tokens', record['completion_tokens'])
+        return response
+
+    return timed_call
+
+def run_fact_check(claim):
+    """
+    Run the fact-check crew for a claim.
+
+    Returns the crew output together with the evidence get_news handed to the
+    Retriever_Agent during the run, so the search, scrape, embed and rerank
+    stages only ever run once per claim. Uses the PipelineRun already active
+    on this thread if there is one, so the caller can read its metrics.
+    """
+    # kickoff() interpolates the claim into the shared tasks, so every run needs its own copy
+    crew = fact_check_crew.copy()
+    time_llm_calls(crew)
+    with ensure_run(claim) as run:
+        output = crew.kickoff(inputs={'claim': claim})
+
+    context = run.context
+    if not context and len(output.tasks_output) > 1:
+        # The retriever answered without calling get_news, fall back to its task output
+        context = output.tasks_output[1].raw
+
+    return output, context
+
+def analysis_messages(claim, context):
+    """Build the Analyst_Agent's prompt for a claim and the retrieved context"""
+    return [
+        ("system", f"You are {Analyst_Agent.role}. {Analyst_Agent.backstory}\nYour personal goal is: {Analyst_Agent.goal}"),
+        ("human", (
+            f"{analysis_task.description.format(claim=claim)}\n\n"
+            f"This is the context you're working with:\n{context}\n\n"
+            f"This is the expected criteria for your final answer: {analysis_task.expected_output}"
+        )),
+    ]
+
+def stream_fact_check(claim):
+    """
+    Streaming variant of run_fact_check.
+
+    The crew handles research and retrieval, reporting each stage to the
+    active run's listener as it finishes, then the analysis is streamed from
+    the LLM so the listener receives the analyst's answer token by token.
+    """
+    crew = evidence_crew.copy()
+    time_llm_calls(crew)
+    with ensure_run(claim) as run:
+        output = crew.kickoff(inputs={'claim': claim})
+        context = run.context or output.raw
+
+        messages = analysis_messages(claim, context)
+        tokens = []
+        with stage('llm_call', agent=Analyst_Agent.role, prompt_tokens=count_message_tokens(messages, llm.model_name)) as record:
+            chunks = replay.stream(
+                'chat_stream', {'model': llm.model_name, 'messages': messages},
+                lambda: llm.stream(messages),
+                encode=lambda chunk: chunk.content,
+                decode=lambda content: AIMessageChunk(content=content)
+            )
+            for chunk in chunks:
+                if chunk.content:
+                    tokens.append(chunk.content)
+                    run.emit('token', text=chunk.content)
+            record['completion_tokens'] = count_tokens("".join(tokens), llm.model_name)
+        count('prompt_tokens', record['prompt_tokens'])
+        count('completion_tokens', record['completion_tokens'])
+
+    return "".join(tokens), context
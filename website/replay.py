@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from .pipeline import add_observer, current_run
+
+OFF = 'off'
+RECORD = 'record'
+REPLAY = 'replay'
+
+# Kinds whose requests legitimately change between runs, e.g. prompts built from whatever
+# chunks Chroma held, so an unmatched call may take the recording made at the same point.
+# Anything else, like a page or an embedding, must match exactly or the run would get another request's data.
+ORDERED_KINDS = ('chat', 'chat_stream')
+
+DEFAULT_FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'replay')
+
+
+class ReplayMiss(LookupError):
+    """Raised in replay mode when a call has no recording"""
+
+
+class Cassette:
+    """
+    Recorded calls of one claim, stored as a JSON file.
+
+    Calls are matched on their exact request first. If a chat request was not
+    recorded, e.g. because the Chroma store held different chunks when the
+    prompt was built, the n-th chat call gets the n-th chat recording. Other
+    kinds raise ReplayMiss instead.
+    """
+    def __init__(self, path, claim):
+        self.path = path
+        self.claim = claim
+        self.interactions = []
+        self._plays = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.interactions = json.load(f)['interactions']
+
+    def rewind(self, clear=False):
+        with self._lock:
+            self._plays = {}
+            if clear:
+                self.interactions = []
+
+    def record(self, kind, key, request, response, seconds):
+        self.record_all([(kind, key, request, response, seconds)])
+
+    def record_all(self, entries):
+        """Append (kind, key, request, response, seconds) entries and save the file once"""
+        with self._lock:
+            for kind, key, request, response, seconds in entries:
+                self.interactions.append({
+                    'kind': kind,
+                    'key': key,
+                    'request': request,
+                    'response': response,
+                    'seconds': round(seconds, 4)
+                })
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({'claim': self.claim, 'interactions': self.interactions}, f, indent=1)
+
+    def play(self, kind, key):
+        with self._lock:
+            recorded = [interaction for interaction in self.interactions if interaction['kind'] == kind]
+            index = self._plays.get(kind, 0)
+            self._plays[kind] = index + 1
+
+            for interaction in recorded:
+                if interaction['key'] == key:
+                    return interaction
+
+            if kind in ORDERED_KINDS and index < len(recorded):
+                print(f"Replaying {kind} call {index} of {self.path} out of order, its request was not recorded")
+                return recorded[index]
+
+        if kind in ORDERED_KINDS:
+            raise ReplayMiss(f"No recorded {kind} call left in {self.path}")
+        raise ReplayMiss(f"{kind} call {key} was not recorded in {self.path}")
+
+
+class Replay:
+    """
+    Record/replay layer for the calls that leave the machine: web search, page
+    fetches, chat completions and embeddings.
+
+    In record mode each call goes through and its response is written to the
+    cassette of the active run's claim. In replay mode the response is read
+    back instead, after sleeping `latency` seconds, or as long as the original
+    call took if latency is 'recorded'. Off, calls go straight through.
+    """
+    def __init__(self, mode=OFF, directory=DEFAULT_FIXTURES_DIR, latency=0.0):
+        self.mode = OFF
+        self.directory = directory
+        self.latency = 0.0
+        self._cassettes = {}
+        self._lock = threading.Lock()
+        self.configure(mode=mode, latency=latency)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            mode=os.getenv('FACTFINDER_REPLAY_MODE') or OFF,
+            directory=os.getenv('FACTFINDER_REPLAY_DIR') or DEFAULT_FIXTURES_DIR,
+            latency=os.getenv('FACTFINDER_REPLAY_LATENCY') or 0.0
+        )
+
+    def configure(self, mode=None, directory=None, latency=None):
+        if mode is not None:
+            mode = mode.lower()
+            if mode not in (OFF, RECORD, REPLAY):
+                raise ValueError(f"Unknown replay mode {mode!r}, expected off, record or replay")
+            self.mode = mode
+        if directory is not None:
+            self.directory = directory
+        if latency is not None:
+            self.latency = latency if latency == 'recorded' else float(latency)
+        with self._lock:
+            self._cassettes = {}
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    @property
+    def active(self):
+        """
+        True while recording or replaying. Caches in front of recorded calls
+        must be skipped then: a hit recorded nothing, so replaying the run
+        elsewhere would miss.
+        """
+        return self.mode != OFF
+
+    def cassette(self, claim):
+        with self._lock:
+            if claim not in self._cassettes:
+                slug = re.sub(r'[^a-z0-9]+', '-', claim.lower()).strip('-')[:40]
+                digest = hashlib.sha1(claim.encode('utf-8')).hexdigest()[:10]
+                path = os.path.join(self.directory, f"{slug}-{digest}.json")
+                self._cassettes[claim] = Cassette(path, claim)
+            return self._cassettes[claim]
+
+    def _current_cassette(self):
+        run = current_run()
+        return self.cassette(run.claim if run is not None else 'default')
+
+    def run_started(self, run):
+        # Pipeline observer: every run of a claim replays its cassette from the start,
+        # and recording a claim again replaces the old recording
+        if self.mode != OFF:
+            self.cassette(run.claim).rewind(clear=self.mode == RECORD)
+
+    def call(self, kind, request, fn, encode=None, decode=None):
+        """
+        Run fn() through the record/replay layer. request identifies the call
+        and must be JSON serializable, as must encode(response).
+        """
+        if self.mode == OFF:
+            return fn()
+
+        key = request_key(kind, request)
+        if self.mode == REPLAY:
+            interaction = self._current_cassette().play(kind, key)
+            self._sleep(interaction['seconds'])
+            return decode(interaction['response']) if decode else interaction['response']
+
+        started = time.perf_counter()
+        response = fn()
+        self._current_cassette().record(
+            kind, key, request, encode(response) if encode else response, time.perf_counter() - started
+        )
+        return response
+
+    def call_batch(self, kind, requests, fn):
+        """
+        Like call() for fn() returning one response per request, e.g. embedding
+        a list of texts. Each request is recorded and replayed on its own, so
+        later runs may batch them differently, as when some texts are cached.
+        """
+        if self.mode == OFF:
+            return fn()
+
+        cassette = self._current_cassette()
+        if self.mode == REPLAY:
+            interactions = [cassette.play(kind, request_key(kind, request)) for request in requests]
+            self._sleep(sum(interaction['seconds'] for interaction in interactions))
+            return [interaction['response'] for interaction in interactions]
+
+        started = time.perf_counter()
+        responses = fn()
+        seconds = (time.perf_counter() - started) / max(len(requests), 1)
+        cassette.record_all([
+            (kind, request_key(kind, request), request, response, seconds)
+            for request, response in zip(requests, responses)
+        ])
+        return responses
+
+    def stream(self, kind, request, fn, encode=None, decode=None):
+        """Like call() for a generator, recording each item it yields"""
+        if self.mode == OFF:
+            yield from fn()
+            return
+
+        key = request_key(kind, request)
+        if self.mode == REPLAY:
+            interaction = self._current_cassette().play(kind, key)
+            items = interaction['response']
+            for item in items:
+                self._sleep(interaction['seconds'] / max(len(items), 1))
+                yield decode(item) if decode else item
+            return
+
+        started = time.perf_counter()
+        items = []
+        for item in fn():
+            items.append(encode(item) if encode else item)
+            yield item
+        self._current_cassette().record(kind, key, request, items, time.perf_counter() - started)
+
+    def _sleep(self, recorded_seconds):
+        seconds = recorded_seconds if self.latency == 'recorded' else self.latency
+        if seconds > 0:
+            time.sleep(seconds)
+
+
+def request_key(kind, request):
+    payload = json.dumps([kind, request], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+replay = Replay.from_env()
+add_observer(replay)
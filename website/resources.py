@@ -0,0 +1,144 @@
+import time
+import atexit
+import threading
+import httpx
+from langchain.retrievers.document_compressors import LLMChainExtractor
+from .embeddings import (
+    create_embeddings, create_local_embeddings, embedding_batcher, EMBEDDING_MODEL, LOCAL_EMBEDDING_MODEL
+)
+from .vector_store import news_store
+from .scraper import fetcher
+
+
+class Resources:
+    """
+    Clients shared by every request thread of the process: the embeddings,
+    either OpenAI's with their HTTP connection pool or a local model kept in
+    memory, the news collection in
+    ./chroma_db, the LLMChainExtractor of get_news and the scraper's fetcher.
+    The embedding batcher is shut down with them.
+
+    Each is created on first use and kept, so a fact-check doesn't re-open
+    the persistent directory or set up a new HTTP client. `close` shuts them
+    down and runs at interpreter exit.
+    """
+    # Seconds between checks that the news collection wasn't rebuilt by another process
+    STORE_CHECK_INTERVAL = 30
+
+    def __init__(self, app=None):
+        self.openai_max_connections = 20
+        self.embedding_backend = 'openai'
+        self.local_embedding_model = LOCAL_EMBEDDING_MODEL
+        self.local_embedding_int8 = True
+        self.local_embedding_batch_size = 32
+        self._embeddings = None
+        self._http_client = None
+        self._news_store = None
+        self._news_store_checked = 0.0
+        self._compressor = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.openai_max_connections = int(app.config.get('OPENAI_MAX_CONNECTIONS', self.openai_max_connections))
+        self.embedding_backend = app.config.get('EMBEDDING_BACKEND', self.embedding_backend)
+        self.local_embedding_model = app.config.get('LOCAL_EMBEDDING_MODEL', self.local_embedding_model)
+        self.local_embedding_int8 = app.config.get('LOCAL_EMBEDDING_INT8', self.local_embedding_int8)
+        self.local_embedding_batch_size = int(
+            app.config.get('LOCAL_EMBEDDING_BATCH_SIZE', self.local_embedding_batch_size)
+        )
+        if self.embedding_backend not in ('openai', 'local'):
+            raise ValueError(f"EMBEDDING_BACKEND must be openai or local, not {self.embedding_backend}")
+        app.extensions['resources'] = self
+
+    @property
+    def embedding_model(self):
+        """Name of the model the embeddings use, known without loading it"""
+        return self.local_embedding_model if self.embedding_backend == 'local' else EMBEDDING_MODEL
+
+    @property
+    def embedding_tokenizer(self):
+        """Hugging Face tokenizer of the local model, None for OpenAI, whose tokens tiktoken counts"""
+        if self.embedding_backend != 'local':
+            return None
+        return self.embeddings.embeddings.tokenizer
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None and self.embedding_backend == 'local':
+                    self._embeddings = create_local_embeddings(
+                        self.local_embedding_model,
+                        int8=self.local_embedding_int8,
+                        batch_size=self.local_embedding_batch_size
+                    )
+                elif self._embeddings is None:
+                    # The embeddings are called from many threads at once, so their pool is sized for it
+                    self._http_client = httpx.Client(limits=httpx.Limits(
+                        max_connections=self.openai_max_connections,
+                        max_keepalive_connections=self.openai_max_connections
+                    ))
+                    self._embeddings = create_embeddings(http_client=self._http_client)
+        return self._embeddings
+
+    @property
+    def news_store(self):
+        if self._news_store is not None and time.monotonic() - self._news_store_checked > self.STORE_CHECK_INTERVAL:
+            self._check_news_store()
+        if self._news_store is None:
+            embeddings = self.embeddings
+            with self._lock:
+                if self._news_store is None:
+                    self._news_store = news_store(embeddings)
+                    self._news_store_checked = time.monotonic()
+        return self._news_store
+
+    def _check_news_store(self):
+        store = self._news_store
+        self._news_store_checked = time.monotonic()
+        if store is None:
+            return
+        try:
+            current_id = store._client.get_collection(store._collection.name).id
+        except Exception:
+            current_id = None
+        # `flask evict-chroma` from cron rebuilds the collection under a new ID
+        if current_id != store._collection.id:
+            self.reset_news_store()
+
+    def compressor(self, llm):
+        if self._compressor is None:
+            with self._lock:
+                if self._compressor is None:
+                    self._compressor = LLMChainExtractor.from_llm(llm)
+        return self._compressor
+
+    @property
+    def fetcher(self):
+        return fetcher
+
+    def reset_news_store(self):
+        """Forget the news collection, e.g. after it was rebuilt under a new ID"""
+        with self._lock:
+            self._news_store = None
+
+    def close(self):
+        with self._lock:
+            http_client, self._http_client = self._http_client, None
+            self._embeddings = None
+            self._news_store = None
+            self._compressor = None
+
+        try:
+            fetcher.close()
+        except Exception as e:
+            print(f"Error closing the fetcher: {str(e)}")
+        embedding_batcher.close()
+        if http_client is not None:
+            http_client.close()
+
+
+resources = Resources()
@@ -0,0 +1,77 @@
+import threading
+import click
+from flask import current_app
+from .vector_store import evict_news_chunks, rebuild_news_collection, collection_for_model, write_lock, NEWS_COLLECTION
+from .resources import resources
+
+
+class ChromaRetention:
+    """
+    Background thread keeping the news collection in ./chroma_db to a fixed
+    age and size, so MMR queries in get_news don't slow down as traffic grows.
+
+    Every `interval` seconds chunks fetched more than `max_age` seconds ago
+    are evicted, then the oldest ones beyond `max_chunks`. If that removed at
+    least `rebuild_fraction` of the collection, the HNSW index is rebuilt and
+    the SQLite file vacuumed.
+    """
+    def __init__(self, app=None):
+        self.interval = 60 * 60
+        self.max_age = 30 * 24 * 60 * 60
+        self.max_chunks = 50000
+        self.rebuild_fraction = 0.1
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.interval = int(app.config.get('CHROMA_RETENTION_INTERVAL', self.interval))
+        self.max_age = int(app.config.get('CHROMA_MAX_AGE', self.max_age))
+        self.max_chunks = int(app.config.get('CHROMA_MAX_CHUNKS', self.max_chunks))
+        app.extensions['chroma_retention'] = self
+        # Like the job queue, wait for the first request so CLI commands don't start the thread
+        app.before_request(self._ensure_started)
+
+    def _ensure_started(self):
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chroma-retention', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Error in Chroma retention: {str(e)}")
+
+    def run_once(self, rebuild=False):
+        collection_name = collection_for_model(NEWS_COLLECTION, resources.embedding_model)
+        with write_lock:
+            before, deleted = evict_news_chunks(
+                max_age=self.max_age or None, max_chunks=self.max_chunks or None, collection_name=collection_name
+            )
+        rebuilt = rebuild or (deleted > 0 and deleted >= before * self.rebuild_fraction)
+        if rebuilt:
+            # Takes write_lock itself, only for the swap; the shared store is reset once the rebuilt one has the name
+            rebuild_news_collection(collection_name=collection_name, on_swap=resources.reset_news_store)
+
+        print(f"Chroma retention: {deleted} of {before} chunks evicted{', index rebuilt' if rebuilt else ''}")
+        return {'before': before, 'evicted': deleted, 'rebuilt': rebuilt}
+
+    def stop(self):
+        self._stop.set()
+
+
+chroma_retention = ChromaRetention()
+
+
+@click.command('evict-chroma')
+@click.option('--rebuild', is_flag=True, help='Rebuild the index and vacuum even if little was evicted')
+def evict_chroma_command(rebuild):
+    """Evict old chunks from ./chroma_db now, with the app's retention settings"""
+    current_app.extensions['chroma_retention'].run_once(rebuild=rebuild)
@@ -0,0 +1,203 @@
+import time
+import base64
+import asyncio
+import threading
+import aiohttp
+from urllib.parse import urlparse
+from .host_health import HostHealth, CircuitOpen, is_failure
+
+CHUNK_SIZE = 16 * 1024
+
+# Marker the scraper has always used to skip paywalled pages, matched in the head of the page
+PAYWALL_MARKER = b'paywall'
+
+
+class FetchedPage:
+    """
+    A downloaded page: what scrape_content needs from the HTTP response.
+    rejected says why the download was dropped early, if it was, and
+    truncated that the page was cut off at the byte budget.
+    """
+    def __init__(self, url, status_code, headers, content, seconds=0.0, rejected=None, truncated=False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.seconds = seconds
+        self.rejected = rejected
+        self.truncated = truncated
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'status_code': self.status_code,
+            'headers': dict(self.headers),
+            'content': base64.b64encode(self.content).decode('ascii'),
+            'rejected': self.rejected,
+            'truncated': self.truncated
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['url'], data['status_code'], data['headers'], base64.b64decode(data['content']),
+            rejected=data.get('rejected'), truncated=data.get('truncated', False)
+        )
+
+
+def rejected_content_type(content_type):
+    """Reason to drop a response by its Content-Type, or None for pages worth parsing"""
+    if not content_type:
+        return None
+    media_type = content_type.split(';')[0].strip().lower()
+    if media_type.startswith('text/') or 'html' in media_type or 'xml' in media_type:
+        return None
+    return f"content type {media_type}"
+
+
+class Fetcher:
+    """
+    Downloads pages on an asyncio event loop running in a background thread,
+    with one connection pool shared by every request in the process.
+
+    Callers on any thread use submit() to start a download and get a
+    concurrent.futures.Future back. The pool caps connections per host and
+    in total, and every request has connect, read and total timeouts, so one
+    slow site can hold up neither other downloads nor the calling worker.
+
+    Bodies are streamed: binary responses are dropped on their headers,
+    paywalled pages once the first head_bytes are in, and pages are cut off
+    after max_bytes. The connection is closed rather than drained in each case.
+
+    Requests to each host go through its token bucket and circuit breaker, so
+    a site that keeps timing out or throttling us is skipped for a while
+    instead of costing every fact-check the full timeout.
+    """
+    def __init__(self, max_in_flight=20, per_host=2, connect_timeout=5.0, read_timeout=10.0, total_timeout=20.0,
+                 max_bytes=2 * 1024 * 1024, head_bytes=64 * 1024):
+        self.max_in_flight = max_in_flight
+        self.per_host = per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_bytes = max_bytes
+        self.head_bytes = head_bytes
+        self.hosts = HostHealth()
+        self._loop = None
+        self._thread = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_in_flight = int(app.config.get('SCRAPER_MAX_IN_FLIGHT') or self.max_in_flight)
+        self.per_host = int(app.config.get('SCRAPER_PER_HOST') or self.per_host)
+        self.connect_timeout = float(app.config.get('SCRAPER_CONNECT_TIMEOUT') or self.connect_timeout)
+        self.read_timeout = float(app.config.get('SCRAPER_READ_TIMEOUT') or self.read_timeout)
+        self.total_timeout = float(app.config.get('SCRAPER_TOTAL_TIMEOUT') or self.total_timeout)
+        self.max_bytes = int(app.config.get('SCRAPER_MAX_BYTES') or self.max_bytes)
+        self.head_bytes = int(app.config.get('SCRAPER_HEAD_BYTES') or self.head_bytes)
+        self.hosts = HostHealth(
+            rate=float(app.config.get('SCRAPER_HOST_RATE', self.hosts.rate)),
+            burst=int(app.config.get('SCRAPER_HOST_BURST', self.hosts.burst)),
+            failure_rate=float(app.config.get('SCRAPER_BREAKER_FAILURE_RATE', self.hosts.failure_rate)),
+            min_requests=int(app.config.get('SCRAPER_BREAKER_MIN_REQUESTS', self.hosts.min_requests)),
+            cooldown=float(app.config.get('SCRAPER_BREAKER_COOLDOWN', self.hosts.cooldown))
+        )
+        app.extensions['fetcher'] = self
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='scraper', daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def submit(self, url, headers=None):
+        """Start downloading url and return a Future resolving to a FetchedPage"""
+        return asyncio.run_coroutine_threadsafe(self._fetch(url, headers), self._ensure_loop())
+
+    def fetch(self, url, headers=None):
+        return self.submit(url, headers).result()
+
+    async def _get_session(self):
+        # Created on the loop's thread, which aiohttp requires
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_in_flight, limit_per_host=self.per_host, ttl_dns_cache=300
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=self.total_timeout, sock_connect=self.connect_timeout, sock_read=self.read_timeout
+                )
+            )
+        return self._session
+
+    async def _fetch(self, url, headers=None):
+        host = urlparse(url).hostname or ''
+        breaker, bucket = self.hosts.get(host)
+        if not breaker.allow():
+            raise CircuitOpen(f"Too many recent failures from {host}, skipping it for now")
+
+        success = None
+        try:
+            await asyncio.sleep(bucket.reserve())
+            session = await self._get_session()
+            started = time.perf_counter()
+            async with session.get(url, headers=headers) as response:
+                page = FetchedPage(str(response.url), response.status, dict(response.headers), b'')
+                page.rejected = rejected_content_type(response.headers.get('Content-Type'))
+                if page.rejected is None:
+                    page.content, page.rejected, page.truncated = await self._read_body(response)
+                if page.rejected or page.truncated:
+                    response.close()
+                page.seconds = time.perf_counter() - started
+                success = not is_failure(response.status)
+                return page
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            success = False
+            raise
+        finally:
+            if success is None:
+                breaker.release()
+            else:
+                breaker.record(success)
+
+    async def _read_body(self, response):
+        """Returns (content, rejected, truncated)"""
+        body = bytearray()
+        head_checked = False
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            body.extend(chunk)
+            if not head_checked and len(body) >= self.head_bytes:
+                head_checked = True
+                if PAYWALL_MARKER in bytes(body[:self.head_bytes]).lower():
+                    return b'', 'paywall', False
+            if len(body) >= self.max_bytes:
+                return bytes(body[:self.max_bytes]), None, True
+
+        if not head_checked and PAYWALL_MARKER in bytes(body).lower():
+            return b'', 'paywall', False
+        return bytes(body), None, False
+
+    def close(self):
+        """Close the connection pool and stop the event loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), loop).result()
+            self._session = None
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+
+fetcher = Fetcher()
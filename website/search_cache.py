@@ -0,0 +1,78 @@
+import re
+import threading
+from cachetools import TTLCache
+
+STOPWORDS = frozenset("""
+a an the and or but of to in on at by for with from about as into than then
+is are was were be been being am do does did has have had will would shall should
+can could may might must it its this that these those there here
+i you he she we they me him her us them my your his our their
+what which who whom whose when where why how
+""".split())
+
+
+def normalize_query(query):
+    """
+    Fold a search query to its cache key: lowercase, punctuation and extra
+    whitespace removed, stopwords dropped unless nothing else is left.
+    """
+    words = re.findall(r'\w+', query.lower())
+    content_words = [word for word in words if word not in STOPWORDS]
+    return ' '.join(content_words or words)
+
+
+class SearchCache:
+    """
+    In-memory TTL cache of DuckDuckGo results, keyed by the normalized query.
+    Only the {'url', 'title'} lists are kept.
+    """
+    def __init__(self, ttl=60 * 60, max_entries=1024):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._configure(ttl, max_entries)
+
+    def init_app(self, app):
+        self._configure(
+            int(app.config.get('SEARCH_CACHE_TTL', self.ttl)),
+            int(app.config.get('SEARCH_CACHE_MAX_ENTRIES', self.max_entries))
+        )
+        app.extensions['search_cache'] = self
+
+    def _configure(self, ttl, max_entries):
+        with self._lock:
+            self.ttl = ttl
+            self.max_entries = max_entries
+            self._results = TTLCache(maxsize=max_entries, ttl=ttl) if ttl > 0 and max_entries > 0 else None
+
+    def get(self, query):
+        with self._lock:
+            if self._results is None:
+                return None
+            results = self._results.get(normalize_query(query))
+            if results is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(results)
+
+    def put(self, query, results):
+        if not results:
+            return
+        with self._lock:
+            if self._results is not None:
+                self._results[normalize_query(query)] = [
+                    {'url': result['url'], 'title': result['title']} for result in results
+                ]
+
+    def clear(self):
+        with self._lock:
+            if self._results is not None:
+                self._results.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+search_cache = SearchCache()
@@ -0,0 +1,86 @@
+from urllib.parse import urlparse
+
+ALLOW = 'allow'
+DENY = 'deny'
+PAYWALL = 'paywall'
+
+# Sources the analyst is told never to cite
+DEFAULT_DENY = (
+    'wikipedia.org', 'wikimedia.org', 'wiktionary.org', 'wikiwand.com', 'wikidata.org'
+)
+
+# Sites that serve their articles behind a paywall, so scraping them only ever returns a teaser
+DEFAULT_PAYWALL = (
+    'wsj.com', 'ft.com', 'nytimes.com', 'washingtonpost.com', 'economist.com', 'bloomberg.com',
+    'thetimes.co.uk', 'telegraph.co.uk', 'theathletic.com', 'barrons.com', 'newyorker.com',
+    'theatlantic.com'
+)
+
+
+class SourcePolicy:
+    """
+    Allow/deny/paywall rules for the domains of search results, checked before
+    anything is downloaded.
+
+    A rule for a domain also covers its subdomains, and the most specific rule
+    wins, so allowing `blogs.ft.com` lets it through while `ft.com` stays a
+    known paywall. The rules are compiled into a trie of reversed domain labels,
+    so a lookup costs one dict access per label of the host.
+    """
+    def __init__(self, allow=(), deny=DEFAULT_DENY, paywall=DEFAULT_PAYWALL):
+        self._index = {}
+        self.update(allow=allow, deny=deny, paywall=paywall)
+
+    def init_app(self, app):
+        self.update(
+            allow=_split(app.config.get('SOURCE_ALLOW')),
+            deny=_split(app.config.get('SOURCE_DENY')),
+            paywall=_split(app.config.get('SOURCE_PAYWALL'))
+        )
+        app.extensions['source_policy'] = self
+
+    def update(self, allow=(), deny=(), paywall=()):
+        """Add rules; a domain listed again takes its latest verdict"""
+        for verdict, domains in ((PAYWALL, paywall), (DENY, deny), (ALLOW, allow)):
+            for domain in domains:
+                node = self._index
+                for label in reversed(_normalize_host(domain).split('.')):
+                    node = node.setdefault(label, {})
+                node[None] = verdict
+
+    def verdict(self, url):
+        """The verdict of the most specific rule covering the URL's host, or None if no rule does"""
+        host = _normalize_host(urlparse(url).hostname or '')
+        node = self._index
+        verdict = None
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            verdict = node.get(None, verdict)
+        return verdict
+
+    def filter(self, links):
+        """Split {'url', 'title'} links into (kept, skipped), skipped holding (link, verdict) pairs"""
+        kept, skipped = [], []
+        for link in links:
+            verdict = self.verdict(link['url'])
+            if verdict in (DENY, PAYWALL):
+                skipped.append((link, verdict))
+            else:
+                kept.append(link)
+        return kept, skipped
+
+
+def _normalize_host(host):
+    host = host.strip().lower().rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+
+def _split(value):
+    if not value:
+        return ()
+    return tuple(domain.strip() for domain in value.split(',') if domain.strip())
+
+
+source_policy = SourcePolicy()
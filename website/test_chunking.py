@@ -0,0 +1,53 @@
+import re
+from . import chunking
+from .chunking import SentenceChunker, split_sentences
+from .tokens import count_tokens
+
+
+def test_split_sentences_keeps_abbreviations():
+    text = 'Dr. Ruto met U.S. officials on Monday. They talked for hours! Was it worth it?\nNobody knows.'
+    assert split_sentences(text) == [
+        'Dr. Ruto met U.S. officials on Monday.', 'They talked for hours!', 'Was it worth it?', 'Nobody knows.'
+    ]
+
+
+def test_chunks_hold_whole_sentences_within_budget():
+    sentences = [f"Sentence number {i} says something about the claim being checked here." for i in range(40)]
+    chunker = SentenceChunker(max_tokens=64, overlap_tokens=16)
+    chunks = chunker.split_text(' '.join(sentences))
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert count_tokens(chunk, chunker.model) <= 64
+        assert chunk.endswith('.')
+    # Only whole sentences, each in at most two chunks
+    for sentence in sentences:
+        assert 1 <= sum(chunk.count(sentence) for chunk in chunks) <= 2
+
+    assert chunker.split_text('Short article.') == ['Short article.']
+
+
+class WordTokenizer:
+    """Stands in for a Hugging Face tokenizer, one lowercased token per word"""
+    def encode(self, text, add_special_tokens=True):
+        return [word.lower() for word in text.split()]
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False):
+        return {'offset_mapping': [match.span() for match in re.finditer(r'\S+', text)]}
+
+
+def test_local_tokenizer_counts_and_cuts():
+    chunker = SentenceChunker(max_tokens=4, overlap_tokens=1, tokenizer=WordTokenizer())
+    chunks = chunker.split_text('One Two Three Four Five Six Seven.')
+
+    # Cut at word offsets, so the text keeps its case
+    assert chunks == ['One Two Three Four', 'Five Six Seven.']
+
+
+def test_overlong_word_is_cut_without_tokenizer(monkeypatch):
+    monkeypatch.setattr(chunking, 'get_encoding', lambda model: None)
+    chunker = SentenceChunker(max_tokens=4, overlap_tokens=1)
+    pieces = chunker._cut('see https://example.com/a/very/long/path/to/an/article')
+
+    assert ''.join(pieces[i][0] for i in range(1, len(pieces))) == 'https://example.com/a/very/long/path/to/an/article'
+    assert all(len(piece) <= 16 for piece, _ in pieces)
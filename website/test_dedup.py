@@ -0,0 +1,27 @@
+from .dedup import dedupe_articles, minhash, similarity
+
+WIRE_STORY = (
+    "NAIROBI (AP) - Kenya's President William Ruto said on Tuesday that the government had not paid "
+    "any money to host the Grammy Awards, dismissing reports circulating on social media as false. "
+    "Speaking at a press briefing in Nairobi, Ruto said talks with the Recording Academy were about "
+    "a partnership to promote African music and did not involve public funds."
+)
+
+def test_syndicated_copies_are_collapsed_and_keep_every_url():
+    articles = [
+        {'url': 'https://apnews.com/ruto-grammys', 'title': 'AP', 'content': WIRE_STORY},
+        {'url': 'https://example.com/ruto', 'title': 'Copy', 'content': WIRE_STORY + " Read more on our site."},
+        {'url': 'https://citizen.digital/budget', 'title': 'Budget', 'content': (
+            "The National Treasury has published the supplementary budget, which cuts allocations to "
+            "county governments and raises spending on roads, according to documents tabled in Parliament."
+        )}
+    ]
+
+    deduped = dedupe_articles(articles)
+
+    assert [article['title'] for article in deduped] == ['AP', 'Budget']
+    assert deduped[0]['urls'] == ['https://apnews.com/ruto-grammys', 'https://example.com/ruto']
+
+def test_minhash_similarity_tracks_overlap():
+    assert similarity(minhash(WIRE_STORY), minhash(WIRE_STORY)) == 1.0
+    assert similarity(minhash(WIRE_STORY), minhash("Completely unrelated text about football results.")) < 0.2
@@ -0,0 +1,45 @@
+import threading
+from .embeddings import EmbeddingBatcher
+
+
+class RecordingEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text))] for text in texts]
+
+
+def test_concurrent_texts_share_one_batch():
+    embeddings = RecordingEmbeddings()
+    batcher = EmbeddingBatcher(wait=0.2, tokens_per_minute=0)
+    results = {}
+
+    def embed(name, texts):
+        results[name] = batcher.embed(embeddings, texts, [1] * len(texts))
+
+    threads = [
+        threading.Thread(target=embed, args=('a', ['one', 'three'])),
+        threading.Thread(target=embed, args=('b', ['three', 'seven!']))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+
+    # 'three' is wanted by both threads but sent once
+    assert len(embeddings.calls) == 1
+    assert sorted(embeddings.calls[0]) == ['one', 'seven!', 'three']
+    assert results == {'a': [[3.0], [5.0]], 'b': [[5.0], [6.0]]}
+
+
+def test_closed_batcher_sends_directly():
+    embeddings = RecordingEmbeddings()
+    batcher = EmbeddingBatcher(wait=0.2, tokens_per_minute=0)
+    batcher.embed(embeddings, ['one'], [1])
+    batcher.close()
+
+    assert batcher.embed(embeddings, ['three'], [1]) == [[5.0]]
+    assert embeddings.calls == [['one'], ['three']]
@@ -1,4 +1,6 @@
-from .rag_module import fact_check_crew
+import os
+import pytest
+from .replay import replay, OFF, REPLAY
 
 def parse_raw_content(raw_content):
     sections = {}
@@ -18,7 +20,15 @@ def parse_raw_content(raw_content):
 
 def test_fact_check_crew():
     claim = "Did President Ruto pay 500 million to host the Grammys?"
-    result = fact_check_crew.kickoff({'claim': claim})
+    # Replays the claim's cassette unless FACTFINDER_REPLAY_MODE asks for something else,
+    # so the test never reaches DuckDuckGo or OpenAI by accident
+    if replay.mode == OFF:
+        if not os.path.exists(replay.cassette(claim).path):
+            pytest.skip("No cassette recorded for this claim, record one with FACTFINDER_REPLAY_MODE=record")
+        replay.configure(mode=REPLAY)
+
+    from .rag_module import run_fact_check
+    result, _ = run_fact_check(claim)
 
     raw_content = result.raw
     parsed_content = parse_raw_content(raw_content)
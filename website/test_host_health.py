@@ -0,0 +1,78 @@
+import pytest
+from . import host_health
+from .host_health import CircuitBreaker, TokenBucket, CLOSED, HALF_OPEN, OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(host_health, 'time', clock)
+    return clock
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=4, cooldown=30)
+    for success in (True, False, True):
+        breaker.record(success)
+    assert breaker.state == CLOSED, "Fewer than min_requests outcomes should never open the breaker"
+
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=2, cooldown=30)
+    breaker.record(False)
+    breaker.record(False)
+
+    clock.now += 29
+    assert not breaker.allow(), "The breaker should stay open during the cooldown"
+
+    clock.now += 1
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow(), "Only one probe should be let through"
+
+    breaker.release()
+    assert breaker.allow(), "A cancelled probe should make room for another"
+
+
+def test_probe_outcome_closes_or_reopens_breaker(clock):
+    breaker = CircuitBreaker(failure_rate=0.5, min_requests=2, cooldown=30)
+    breaker.record(False)
+    breaker.record(False)
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN, "A failed probe should open the breaker again"
+    assert not breaker.allow(), "The cooldown should start over"
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_token_bucket_waits_for_tokens(clock):
+    bucket = TokenBucket(rate=2.0, burst=2)
+
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5), "Past the burst a request should wait for its token"
+    assert bucket.reserve() == pytest.approx(1.0), "Reservations should queue up behind each other"
+
+    clock.now += 10
+    assert bucket.reserve() == 0.0, "Tokens should refill up to the burst"
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(0.5)
@@ -0,0 +1,43 @@
+from flask import Flask
+from .jobs import JobStore, JobQueue, QUEUED, RUNNING, DONE
+
+def test_job_lifecycle(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.db'))
+    job_id = store.create("Did it rain in Nairobi today?", user_id=1)
+
+    assert store.get(job_id)['status'] == QUEUED, "New jobs should be queued"
+    assert store.claim(job_id), "A queued job should be claimable"
+    assert not store.claim(job_id), "A job should only be claimed once"
+    assert store.get(job_id)['status'] == RUNNING
+
+    store.finish(job_id, {'output': {'Verdict': 'True'}})
+    job = store.get(job_id)
+
+    assert job['status'] == DONE
+    assert job['result'] == {'output': {'Verdict': 'True'}}
+
+def test_recover_requeues_orphaned_jobs(tmp_path):
+    db_path = str(tmp_path / 'jobs.db')
+    store = JobStore(db_path)
+    job_id = store.create("Did it rain in Nairobi today?", user_id=1)
+    store.claim(job_id)
+
+    # A fresh store after a restart sees the job running under a pid that is gone
+    restarted = JobStore(db_path)
+
+    assert restarted.recover() == [job_id], "Orphaned jobs should be queued again"
+    assert restarted.get(job_id)['status'] == QUEUED
+
+def test_queue_passes_options_to_the_runner(tmp_path):
+    app = Flask(__name__)
+    app.config['FACT_CHECK_JOBS_DB'] = str(tmp_path / 'jobs.db')
+    shared = object()
+
+    def runner(claim, user_id=None, admin_id=None, shared_articles=None):
+        return {'claim': claim, 'shared': shared_articles is shared}
+
+    queue = JobQueue(app, runner=runner)
+    job_id = queue.submit("Did it rain in Nairobi today?", user_id=1, shared_articles=shared)
+    queue.executor.shutdown(wait=True)
+
+    assert queue.get(job_id)['result'] == {'claim': "Did it rain in Nairobi today?", 'shared': True}
@@ -0,0 +1,67 @@
+import os
+import pytest
+from . import page_cache as page_cache_module
+from .page_cache import PageCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(page_cache_module, 'time', clock)
+    return clock
+
+
+def text_files(cache):
+    return [name for _, _, names in os.walk(os.path.join(cache.directory, 'texts')) for name in names]
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path, clock):
+    cache = PageCache(str(tmp_path), max_bytes=10)
+    cache.store('https://a.example/story', 'aaaa')
+    clock.now += 1
+    cache.store('https://b.example/story', 'bbbb')
+    clock.now += 1
+    assert cache.lookup('https://a.example/story')['text'] == 'aaaa'
+    clock.now += 1
+    cache.store('https://c.example/story', 'cccc')
+
+    assert cache.lookup('https://b.example/story') is None, "The least recently used page should go first"
+    assert cache.lookup('https://a.example/story')['text'] == 'aaaa'
+    assert cache.lookup('https://c.example/story')['text'] == 'cccc'
+    assert len(text_files(cache)) == 2, "The evicted page's text file should be removed"
+
+
+def test_not_modified_page_is_fresh_again(tmp_path, clock):
+    cache = PageCache(str(tmp_path), freshness=60)
+    cache.store('https://a.example/story', 'Story text.', etag='"v1"')
+    clock.now += 120
+
+    entry = cache.lookup('https://a.example/story')
+    assert not cache.is_fresh(entry)
+    assert cache.validators(entry) == {'If-None-Match': '"v1"'}
+    assert cache.stats() == {'hits': 0, 'misses': 1}
+
+    cache.revalidated('https://a.example/story')
+    assert cache.stats() == {'hits': 1, 'misses': 0}, "A 304 should turn the stale lookup into a hit"
+    entry = cache.lookup('https://a.example/story')
+    assert cache.is_fresh(entry) and entry['text'] == 'Story text.'
+
+
+def test_clear_forgets_every_page(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.store('https://a.example/story', 'Story text.')
+    cache.clear()
+
+    assert cache.lookup('https://a.example/story') is None
+    assert text_files(cache) == []
+
+    cache.store('https://a.example/story', 'Story text.')
+    assert cache.lookup('https://a.example/story')['text'] == 'Story text.'
@@ -0,0 +1,51 @@
+from .pipeline import start_run
+import pytest
+from .replay import Replay, ReplayMiss, RECORD, REPLAY
+
+def test_record_then_replay(tmp_path):
+    recorder = Replay(mode=RECORD, directory=str(tmp_path))
+    calls = []
+
+    def search():
+        calls.append(1)
+        return [{'href': 'https://example.com/rain', 'title': 'Rain in Nairobi'}]
+
+    with start_run("Did it rain in Nairobi today?"):
+        recorded = recorder.call('search', {'query': 'rain nairobi'}, search)
+        streamed = list(recorder.stream('chat_stream', {'messages': ['hi']}, lambda: iter(['It ', 'rained'])))
+
+    player = Replay(mode=REPLAY, directory=str(tmp_path))
+    with start_run("Did it rain in Nairobi today?"):
+        assert player.call('search', {'query': 'rain nairobi'}, search) == recorded
+        assert list(player.stream('chat_stream', {'messages': ['hi']}, lambda: iter([]))) == streamed
+
+    assert len(calls) == 1, "Replayed calls should not reach the real function"
+
+def test_replay_falls_back_to_call_order(tmp_path):
+    recorder = Replay(mode=RECORD, directory=str(tmp_path))
+    with start_run("claim"):
+        recorder.call('chat', {'messages': ['prompt built from old chunks']}, lambda: 'first answer')
+
+    player = Replay(mode=REPLAY, directory=str(tmp_path))
+    with start_run("claim"):
+        assert player.call('chat', {'messages': ['prompt built from new chunks']}, lambda: None) == 'first answer'
+
+def test_unrecorded_pages_are_misses(tmp_path):
+    recorder = Replay(mode=RECORD, directory=str(tmp_path))
+    with start_run("claim"):
+        recorder.call('page', {'url': 'https://example.com/a'}, lambda: '<p>a</p>')
+
+    player = Replay(mode=REPLAY, directory=str(tmp_path))
+    with start_run("claim"):
+        with pytest.raises(ReplayMiss):
+            player.call('page', {'url': 'https://example.com/b'}, lambda: None)
+
+def test_batches_replay_per_request(tmp_path):
+    recorder = Replay(mode=RECORD, directory=str(tmp_path))
+    with start_run("claim"):
+        recorder.call_batch('embedding', ['a', 'b', 'c'], lambda: [[1.0], [2.0], [3.0]])
+
+    # Replayed in a different batch, as when 'a' is already in the embedding cache
+    player = Replay(mode=REPLAY, directory=str(tmp_path))
+    with start_run("claim"):
+        assert player.call_batch('embedding', ['c', 'b'], lambda: None) == [[3.0], [2.0]]
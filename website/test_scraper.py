@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+from .scraper import Fetcher
+from .host_health import HostHealth
+
+
+class FakeContent:
+    def __init__(self, chunks, error=None):
+        self.chunks = chunks
+        self.error = error
+        self.read = 0
+
+    async def iter_chunked(self, size):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+        if self.error is not None:
+            raise self.error
+
+
+class FakeResponse:
+    """Stands in for an aiohttp response streaming `chunks`, then raising `error` if given"""
+    def __init__(self, chunks, content_type='text/html; charset=utf-8', error=None):
+        self.url = 'https://example.com/story'
+        self.status = 200
+        self.headers = {'Content-Type': content_type}
+        self.content = FakeContent(chunks, error)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, url, headers=None):
+        return self.response
+
+
+def fetch(response, **options):
+    fetcher = Fetcher(**options)
+    fetcher.hosts = HostHealth(rate=0)
+    fetcher._session = FakeSession(response)
+    return asyncio.run(fetcher._fetch(response.url)), fetcher
+
+
+def test_body_is_cut_off_at_max_bytes():
+    response = FakeResponse([b'<p>abcd', b'efghij', b'klmnop', b'qrstuv'])
+    page, _ = fetch(response, max_bytes=12, head_bytes=4)
+
+    assert page.content == b'<p>abcdefghi'
+    assert page.truncated and page.rejected is None
+    assert response.content.read == 2, "Nothing past max_bytes should be read"
+    assert response.closed, "The connection should be closed rather than drained"
+
+
+def test_binary_content_type_is_rejected_unread():
+    response = FakeResponse([b'%PDF-1.7'], content_type='application/pdf')
+    page, _ = fetch(response)
+
+    assert page.rejected == 'content type application/pdf'
+    assert page.content == b''
+    assert response.content.read == 0
+    assert response.closed
+
+
+def test_paywall_is_only_looked_for_in_the_head():
+    response = FakeResponse([b'<div class="PayWall">Subscribe now</div>', b'<p>The story.</p>'])
+    page, _ = fetch(response, head_bytes=32)
+    assert page.rejected == 'paywall' and page.content == b''
+    assert response.content.read == 1, "The rest of a paywalled page should not be downloaded"
+    assert response.closed
+
+    response = FakeResponse([b'<p>A long story.</p>', b'<p>Our paywall policy</p>'])
+    page, _ = fetch(response, head_bytes=16)
+    assert page.rejected is None, "A mention past the head should not count as a paywall"
+    assert page.content == b'<p>A long story.</p><p>Our paywall policy</p>'
+
+    page, _ = fetch(FakeResponse([b'<p>paywall</p>']), head_bytes=1024)
+    assert page.rejected == 'paywall', "A page shorter than the head should still be checked"
+
+
+def test_read_timeout_fails_the_fetch_and_counts_against_the_host():
+    response = FakeResponse([b'<p>Slow'], error=asyncio.TimeoutError())
+    fetcher = Fetcher()
+    fetcher.hosts = HostHealth(rate=0, min_requests=1)
+    fetcher._session = FakeSession(response)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(fetcher._fetch(response.url))
+    assert fetcher.hosts.states() == {'example.com': 'open'}, "A timed out read should count as a failure"
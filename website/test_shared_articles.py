@@ -0,0 +1,122 @@
+import time
+import threading
+import pytest
+from concurrent.futures import Future
+from .pipeline import SharedArticles, start_run
+
+
+@pytest.fixture
+def rag_module():
+    # Loads the reranker, so it is only imported by the tests that need it
+    return pytest.importorskip('website.rag_module')
+
+
+class FakeFetcher:
+    """Downloads of the URLs in `ready` finish straight away, the rest never do"""
+    def __init__(self, ready):
+        self.ready = ready
+        self.downloads = {}
+
+    def submit(self, url, headers=None):
+        future = Future()
+        if url in self.ready:
+            future.set_result(url)
+        self.downloads[url] = future
+        return future
+
+
+class FakeResources:
+    def __init__(self, fetcher):
+        self.fetcher = fetcher
+
+
+class NoPageCache:
+    def lookup(self, url):
+        return None
+
+    def is_fresh(self, cached):
+        return False
+
+    def validators(self, cached):
+        return {}
+
+
+def links(*urls):
+    return [{'url': url, 'title': url} for url in urls]
+
+
+@pytest.fixture
+def fetcher(rag_module, monkeypatch):
+    fetcher = FakeFetcher(ready={'a', 'b'})
+    monkeypatch.setattr(rag_module, 'resources', FakeResources(fetcher))
+    monkeypatch.setattr(rag_module, 'page_cache', NoPageCache())
+    monkeypatch.setattr(rag_module, 'scrape_content', lambda url, download, cached: f"Text of {url}.")
+    return fetcher
+
+
+def test_scraping_stops_at_wanted_articles(rag_module, fetcher):
+    finished = set()
+    articles = rag_module.scrape_links(links('a', 'b', 'slow'), wanted=2, finished=finished)
+
+    assert [article['url'] for article in articles] == ['a', 'b']
+    assert finished == {'a', 'b'}
+    assert fetcher.downloads['slow'].cancelled(), "The download nobody waits for should be cancelled"
+
+
+def test_scraping_stops_at_the_deadline(rag_module, fetcher):
+    started = time.monotonic()
+    articles = rag_module.scrape_links(links('a', 'slow'), wanted=2, deadline=0.1)
+
+    assert time.monotonic() - started < 2
+    assert [article['url'] for article in articles] == ['a']
+    assert fetcher.downloads['slow'].cancelled()
+
+
+def document(rag_module, url):
+    return rag_module.Document(page_content=f"Text of {url}.", metadata={'url': url, 'sources': url})
+
+
+def test_abandoned_pages_are_published_as_none_and_scraped_by_waiters(rag_module, monkeypatch):
+    monkeypatch.setattr(rag_module, 'ARTICLES_PER_CLAIM', 2)
+    monkeypatch.setattr(rag_module, 'duckduckgo_search', lambda query, num_results: links('a', 'b'))
+    shared = SharedArticles()
+    first_claimed = threading.Event()
+    second_waiting = threading.Event()
+    calls = []
+
+    def embed_links(link_list, wanted, finished=None):
+        urls = [link['url'] for link in link_list]
+        calls.append(urls)
+        if urls == ['a', 'b']:
+            # The first claim owns both pages, gets 'a' and runs out of time before 'b'
+            first_claimed.set()
+            assert second_waiting.wait(5)
+            finished.add('a')
+            return [{'url': 'a'}], [document(rag_module, 'a')]
+        if not urls:
+            # The second claim owns nothing and goes on to wait for the first
+            second_waiting.set()
+            return [], []
+        return [{'url': url} for url in urls], [document(rag_module, url) for url in urls]
+
+    monkeypatch.setattr(rag_module, 'embed_links', embed_links)
+    results = {}
+
+    def check(name):
+        with start_run(name, shared_articles=shared):
+            results[name] = rag_module.search_and_embed(name)
+
+    first = threading.Thread(target=check, args=('first',))
+    first.start()
+    assert first_claimed.wait(5)
+    second = threading.Thread(target=check, args=('second',))
+    second.start()
+    first.join(5)
+    second.join(5)
+
+    assert not second.is_alive(), "A claim waiting on an abandoned page should not hang"
+    future, owner = shared.claim('b')
+    assert not owner and future.result() is None, "An abandoned page should be published as None"
+    assert ['b'] in calls, "The waiting claim should scrape the abandoned page itself"
+    assert sorted(doc.metadata['url'] for doc in results['second']) == ['a', 'b']
+    assert [doc.metadata['url'] for doc in results['first']] == ['a']
@@ -0,0 +1,24 @@
+from .source_policy import SourcePolicy, ALLOW, DENY, PAYWALL
+
+def test_rules_cover_subdomains_and_most_specific_wins():
+    policy = SourcePolicy(allow=['blogs.ft.com'])
+
+    assert policy.verdict('https://en.m.wikipedia.org/wiki/Grammy_Awards') == DENY
+    assert policy.verdict('https://www.ft.com/content/123') == PAYWALL
+    assert policy.verdict('https://blogs.ft.com/post') == ALLOW
+    assert policy.verdict('https://www.bbc.com/news') is None
+    assert policy.verdict('https://notwikipedia.org/page') is None, "Only whole labels should match"
+
+def test_filter_keeps_order_and_reports_skipped_links():
+    policy = SourcePolicy()
+    links = [
+        {'url': 'https://www.nytimes.com/story', 'title': 'Paywalled'},
+        {'url': 'https://apnews.com/article', 'title': 'AP'},
+        {'url': 'https://en.wikipedia.org/wiki/Kenya', 'title': 'Wikipedia'},
+        {'url': 'https://www.citizen.digital/news', 'title': 'Citizen'}
+    ]
+
+    kept, skipped = policy.filter(links)
+
+    assert [link['title'] for link in kept] == ['AP', 'Citizen']
+    assert [verdict for _, verdict in skipped] == [PAYWALL, DENY]
@@ -0,0 +1,47 @@
+import tiktoken
+
+_encodings = {}
+
+
+def get_encoding(model):
+    """
+    Return the tiktoken encoding for a model, falling back to cl100k_base for
+    unknown models. Returns None if the encoding can't be loaded, e.g. when
+    its BPE file isn't cached on a machine without internet access.
+    """
+    if model not in _encodings:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception as e:
+            print(f"Error loading tokenizer for {model}, estimating token counts instead: {str(e)}")
+            encoding = None
+        _encodings[model] = encoding
+    return _encodings[model]
+
+
+def count_tokens(text, model):
+    if not text:
+        return 0
+
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model):
+    """Count the content tokens of chat messages given as dicts, tuples or LangChain messages"""
+    total = 0
+    for message in messages:
+        if isinstance(message, dict):
+            content = message.get('content')
+        elif isinstance(message, tuple):
+            content = message[1]
+        else:
+            content = getattr(message, 'content', message)
+        total += count_tokens(content if isinstance(content, str) else str(content), model)
+    return total
@@ -0,0 +1,352 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import click
+from langchain_chroma import Chroma
+from .pipeline import stage, count
+from .embeddings import EMBEDDING_MODEL
+
+CHROMA_DIRECTORY = './chroma_db'
+
+# langchain_chroma's default collection, which the scraped chunks have always been stored in
+NEWS_COLLECTION = 'langchain'
+
+# Held while chunks are written or the collection is rebuilt, so a rebuild never drops new chunks
+write_lock = threading.RLock()
+
+
+def chunk_id(url, text):
+    """Deterministic ID of a chunk: the same text from the same URL always gets the same ID"""
+    url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]
+    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+    return f"{url_hash}-{text_hash}"
+
+
+def collection_for_model(name, model):
+    """
+    Collection holding vectors of an embedding model. Models differ in
+    dimensions, so each gets its own; text-embedding-3-small keeps the
+    collection names from before there was a choice.
+    """
+    if model == EMBEDDING_MODEL:
+        return name
+    slug = re.sub(r'[^a-z0-9]+', '_', model.lower()).strip('_')
+    return f"{name}_{slug}"[:63].rstrip('_')
+
+
+def news_store(embeddings):
+    return Chroma(
+        collection_name=collection_for_model(NEWS_COLLECTION, embeddings.model),
+        persist_directory=CHROMA_DIRECTORY,
+        embedding_function=embeddings
+    )
+
+
+def upsert_documents(documents, vector_store):
+    """
+    Store chunk Documents under their deterministic IDs, stamped with the time
+    they were fetched. Chunks already in the collection are neither embedded
+    nor written again, only their fetched_at is brought forward so retention
+    keeps them. Returns the number of chunks added.
+    """
+    fetched_at = time.time()
+    by_id = {}
+    for doc in documents:
+        doc.metadata['fetched_at'] = fetched_at
+        by_id.setdefault(chunk_id(doc.metadata['url'], doc.page_content), doc)
+
+    with stage('chroma_write', chunks=len(by_id)) as record, write_lock:
+        existing = set(vector_store.get(ids=list(by_id), include=[])['ids'])
+        new_ids = [doc_id for doc_id in by_id if doc_id not in existing]
+        if new_ids:
+            vector_store.add_documents([by_id[doc_id] for doc_id in new_ids], ids=new_ids)
+        if existing:
+            # Metadata only, so nothing is re-embedded; langchain_chroma has no public call for this
+            vector_store._collection.update(
+                ids=list(existing), metadatas=[by_id[doc_id].metadata for doc_id in existing]
+            )
+        record['added'] = len(new_ids)
+        record['existing'] = len(existing)
+    count('chunks_stored', len(new_ids))
+    return len(new_ids)
+
+
+def compact_news_collection(batch_size=1000, collection_name=NEWS_COLLECTION):
+    """
+    Give every chunk in the news collection its deterministic ID and drop the
+    copies left by repeat scrapes from before chunks had one. Stored
+    embeddings are reused, so nothing is sent to OpenAI.
+    """
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=CHROMA_DIRECTORY).get_or_create_collection(collection_name)
+
+    total = collection.count()
+    keep = {}
+    stale_ids = []
+    for offset in range(0, total, batch_size):
+        records = collection.get(include=['documents', 'metadatas'], limit=batch_size, offset=offset)
+        for record_id, document, metadata in zip(records['ids'], records['documents'], records['metadatas']):
+            if not metadata or not metadata.get('url') or document is None:
+                continue
+            new_id = chunk_id(metadata['url'], document)
+            if new_id not in keep:
+                keep[new_id] = record_id
+            elif record_id == new_id:
+                # Keep the copy that already has its deterministic ID, so nothing needs rewriting
+                stale_ids.append(keep[new_id])
+                keep[new_id] = record_id
+            else:
+                stale_ids.append(record_id)
+
+    renamed = {new_id: old_id for new_id, old_id in keep.items() if new_id != old_id}
+    renamed_items = list(renamed.items())
+    for start in range(0, len(renamed_items), batch_size):
+        batch = dict(renamed_items[start:start + batch_size])
+        old_ids = list(batch.values())
+        records = collection.get(ids=old_ids, include=['documents', 'metadatas', 'embeddings'])
+        new_ids = {old_id: new_id for new_id, old_id in batch.items()}
+        collection.upsert(
+            ids=[new_ids[old_id] for old_id in records['ids']],
+            documents=records['documents'],
+            metadatas=records['metadatas'],
+            embeddings=records['embeddings']
+        )
+        collection.delete(ids=old_ids)
+
+    for start in range(0, len(stale_ids), batch_size):
+        collection.delete(ids=stale_ids[start:start + batch_size])
+
+    return {
+        'before': total,
+        'after': collection.count(),
+        'duplicates_removed': len(stale_ids),
+        'ids_rewritten': len(renamed)
+    }
+
+
+def evict_news_chunks(max_age=None, max_chunks=None, batch_size=1000, collection_name=NEWS_COLLECTION):
+    """
+    Delete chunks fetched more than max_age seconds ago, then the oldest ones
+    beyond max_chunks. Chunks stored before they carried fetched_at are
+    stamped with the current time, so they get a full max_age like new ones.
+    Returns (chunks before, chunks deleted).
+    """
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=CHROMA_DIRECTORY).get_or_create_collection(collection_name)
+    total = collection.count()
+    now = time.time()
+    cutoff = now - max_age if max_age else None
+
+    expired = []
+    kept = []
+    unstamped = {}
+    for offset in range(0, total, batch_size):
+        records = collection.get(include=['metadatas'], limit=batch_size, offset=offset)
+        for record_id, metadata in zip(records['ids'], records['metadatas']):
+            fetched_at = (metadata or {}).get('fetched_at')
+            if fetched_at is None:
+                unstamped[record_id] = dict(metadata or {}, fetched_at=now)
+                kept.append((now, record_id))
+            elif cutoff is not None and fetched_at < cutoff:
+                expired.append(record_id)
+            else:
+                kept.append((fetched_at, record_id))
+
+    unstamped_items = list(unstamped.items())
+    for start in range(0, len(unstamped_items), batch_size):
+        batch = unstamped_items[start:start + batch_size]
+        collection.update(ids=[record_id for record_id, _ in batch], metadatas=[metadata for _, metadata in batch])
+
+    if max_chunks is not None and len(kept) > max_chunks:
+        kept.sort()
+        expired.extend(record_id for _, record_id in kept[:len(kept) - max_chunks])
+
+    for start in range(0, len(expired), batch_size):
+        collection.delete(ids=expired[start:start + batch_size])
+    return total, len(expired)
+
+
+def rebuild_news_collection(batch_size=1000, collection_name=NEWS_COLLECTION, on_swap=None):
+    """
+    Copy the news collection into a fresh one and swap it in. Chroma only marks
+    deleted chunks in the HNSW index, so after large evictions a rebuilt index
+    is smaller and faster to search. The SQLite file is vacuumed afterwards.
+
+    The bulk of the copy runs without `write_lock`, and only the chunks written
+    meanwhile are copied while holding it. The old collection is renamed aside
+    rather than deleted until the rebuilt one has its name, and `on_swap` is
+    called in between, so a crash at any point leaves a full copy that the next
+    rebuild finishes swapping in.
+    """
+    import chromadb
+
+    client = chromadb.PersistentClient(path=CHROMA_DIRECTORY)
+    rebuild_name = f"{collection_name}_rebuild"
+    old_name = f"{collection_name}_old"
+    if _recover_rebuild(client, collection_name, rebuild_name, old_name, on_swap):
+        vacuum()
+        return
+
+    old = client.get_or_create_collection(collection_name)
+    new = client.create_collection(rebuild_name, metadata=old.metadata)
+    _copy_changes(old, new, batch_size)
+    with write_lock:
+        _copy_changes(old, new, batch_size)
+        if new.count() != old.count():
+            raise RuntimeError(
+                f"Rebuilt {collection_name} holds {new.count()} chunks instead of {old.count()}, keeping the old one"
+            )
+        old.modify(name=old_name)
+        new.modify(name=collection_name)
+    if on_swap is not None:
+        on_swap()
+    client.delete_collection(old_name)
+    vacuum()
+
+
+def _get_collection(client, name):
+    try:
+        return client.get_collection(name)
+    except Exception:
+        return None
+
+
+def _recover_rebuild(client, collection_name, rebuild_name, old_name, on_swap):
+    """
+    Clean up after a rebuild that stopped part way. Returns True if that left
+    the rebuilt collection in place, so there is nothing more to do.
+    """
+    current = _get_collection(client, collection_name)
+    rebuilt = _get_collection(client, rebuild_name)
+    old = _get_collection(client, old_name)
+
+    if current is not None and current.count() > 0:
+        # The swap finished, or the copy never got that far
+        for name, collection in ((old_name, old), (rebuild_name, rebuilt)):
+            if collection is not None:
+                client.delete_collection(name)
+        return False
+
+    # Only an empty collection, recreated by a query, holds the name
+    source = rebuilt if rebuilt is not None and (old is None or rebuilt.count() == old.count()) else old
+    if source is None:
+        return False
+    if current is not None:
+        client.delete_collection(collection_name)
+    source.modify(name=collection_name)
+    if on_swap is not None:
+        on_swap()
+    for name, collection in ((old_name, old), (rebuild_name, rebuilt)):
+        if collection is not None and collection is not source:
+            client.delete_collection(name)
+    print(f"Recovered {collection_name} from an interrupted rebuild")
+    return True
+
+
+def _copy_changes(old, new, batch_size):
+    """Bring `new` up to date with `old`: add the chunks it lacks, update changed metadata, drop chunks gone from `old`"""
+    old_ids = set()
+    for offset in range(0, old.count(), batch_size):
+        records = old.get(include=['metadatas'], limit=batch_size, offset=offset)
+        if not records['ids']:
+            continue
+        old_ids.update(records['ids'])
+        copied = new.get(ids=records['ids'], include=['metadatas'])
+        copied_metadata = dict(zip(copied['ids'], copied['metadatas']))
+        missing = [record_id for record_id in records['ids'] if record_id not in copied_metadata]
+        changed = [
+            (record_id, metadata) for record_id, metadata in zip(records['ids'], records['metadatas'])
+            if record_id in copied_metadata and metadata and copied_metadata[record_id] != metadata
+        ]
+        if missing:
+            full = old.get(ids=missing, include=['documents', 'metadatas', 'embeddings'])
+            new.add(
+                ids=full['ids'],
+                documents=full['documents'],
+                metadatas=full['metadatas'],
+                embeddings=full['embeddings']
+            )
+        if changed:
+            new.update(ids=[record_id for record_id, _ in changed], metadatas=[metadata for _, metadata in changed])
+
+    stale = []
+    for offset in range(0, new.count(), batch_size):
+        stale.extend(
+            record_id for record_id in new.get(include=[], limit=batch_size, offset=offset)['ids']
+            if record_id not in old_ids
+        )
+    for start in range(0, len(stale), batch_size):
+        new.delete(ids=stale[start:start + batch_size])
+
+
+def reembed_news_collection(embeddings, source=NEWS_COLLECTION, batch_size=256):
+    """
+    Copy the chunks of the `source` collection into the collection of the
+    `embeddings` model, embedding them again. IDs and metadata are kept, and
+    chunks already copied are skipped, so an interrupted run can be resumed.
+    The source collection is left as it is. Yields (chunks read, chunks in
+    source, chunks embedded) after every batch.
+    """
+    import chromadb
+
+    client = chromadb.PersistentClient(path=CHROMA_DIRECTORY)
+    old = client.get_collection(source)
+    new = news_store(embeddings)
+
+    total = old.count()
+    embedded = 0
+    for offset in range(0, total, batch_size):
+        records = old.get(include=['documents', 'metadatas'], limit=batch_size, offset=offset)
+        with write_lock:
+            existing = set(new.get(ids=records['ids'], include=[])['ids'])
+            todo = [
+                (record_id, document, metadata)
+                for record_id, document, metadata in zip(records['ids'], records['documents'], records['metadatas'])
+                if record_id not in existing and document
+            ]
+            if todo:
+                ids, documents, metadatas = zip(*todo)
+                new.add_texts(list(documents), metadatas=list(metadatas), ids=list(ids))
+        embedded += len(todo)
+        yield offset + len(records['ids']), total, embedded
+
+
+def vacuum():
+    """Return the space of deleted rows in Chroma's SQLite file to the filesystem"""
+    conn = sqlite3.connect(os.path.join(CHROMA_DIRECTORY, 'chroma.sqlite3'), timeout=30)
+    try:
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+
+@click.command('compact-chroma')
+@click.option('--batch-size', default=1000, show_default=True, help='Records read and written at a time')
+def compact_chroma_command(batch_size):
+    """Deduplicate the scraped chunks in ./chroma_db and give them deterministic IDs"""
+    stats = compact_news_collection(batch_size=batch_size)
+    click.echo(
+        f"{stats['before']} chunks before, {stats['after']} after: "
+        f"{stats['duplicates_removed']} duplicates removed, {stats['ids_rewritten']} IDs rewritten"
+    )
+
+
+@click.command('reembed-chroma')
+@click.option('--source', default=NEWS_COLLECTION, show_default=True, help='Collection to copy the chunks from')
+@click.option('--batch-size', default=256, show_default=True, help='Chunks embedded at a time')
+def reembed_chroma_command(source, batch_size):
+    """Embed the chunks of another collection with the configured embedding backend"""
+    from .resources import resources
+
+    target = collection_for_model(NEWS_COLLECTION, resources.embedding_model)
+    if target == source:
+        raise click.UsageError(f"{source} already holds {resources.embedding_model} vectors")
+    total = embedded = 0
+    for read, total, embedded in reembed_news_collection(resources.embeddings, source=source, batch_size=batch_size):
+        click.echo(f"Re-embedded {embedded} chunks, {read} of {total} read")
+    click.echo(f"{embedded} of {total} chunks from {source} embedded into {target}")